@@ -0,0 +1,101 @@
+"""
+Cached index of categories and forums visible to each set of groups.
+
+The index holds the groups of every restricted category and the
+category of every forum. It is rebuilt after changes of categories,
+forums or Category.groups. Group ids of users are cached separately
+and dropped when the groups of the user change.
+"""
+import time
+
+from django.core.cache import cache
+
+from djangobb_forum.models import Category, Forum
+
+INDEX_KEY = 'djangobb_access_index'
+CACHE_TIMEOUT = 24 * 60 * 60
+
+# (index version, frozenset of group ids) -> (category ids, forum ids)
+_visible_by_groups = {}
+
+
+def _user_groups_key(user_id):
+    return 'djangobb_user_groups_%d' % user_id
+
+
+def _build_index():
+    categories = dict((category_id, set()) for category_id in
+                      Category.objects.values_list('id', flat=True))
+    for category_id, group_id in Category.groups.through.objects\
+            .values_list('category', 'group'):
+        categories[category_id].add(group_id)
+    forums = list(Forum.objects.order_by('id').values_list('id', 'category'))
+    return {'version': time.time(), 'categories': categories, 'forums': forums}
+
+
+def _index():
+    index = cache.get(INDEX_KEY)
+    if index is None:
+        index = _build_index()
+        cache.set(INDEX_KEY, index, CACHE_TIMEOUT)
+    return index
+
+
+def user_groups(user):
+    """
+    Return frozenset of ids of the user's groups.
+    """
+    if not user.is_authenticated():
+        return frozenset()
+    if not hasattr(user, '_djangobb_groups'):
+        key = _user_groups_key(user.id)
+        groups = cache.get(key)
+        if groups is None:
+            groups = frozenset(user.groups.values_list('id', flat=True))
+            cache.set(key, groups, CACHE_TIMEOUT)
+        user._djangobb_groups = groups
+    return user._djangobb_groups
+
+
+def visible_ids(groups):
+    """
+    Return (category ids, forum ids) visible to members of given groups.
+    """
+    index = _index()
+    key = (index['version'], groups)
+    if key not in _visible_by_groups:
+        if len(_visible_by_groups) > 1000:
+            _visible_by_groups.clear()
+        categories = set(category_id for category_id, category_groups
+                         in index['categories'].iteritems()
+                         if not category_groups or category_groups & groups)
+        forums = [forum_id for forum_id, category_id in index['forums']
+                  if category_id in categories]
+        _visible_by_groups[key] = (categories, forums)
+    return _visible_by_groups[key]
+
+
+def _visible(user):
+    if not hasattr(user, '_djangobb_visible'):
+        user._djangobb_visible = visible_ids(user_groups(user))
+    return user._djangobb_visible
+
+
+def visible_category_ids(user):
+    return _visible(user)[0]
+
+
+def visible_forum_ids(user):
+    return _visible(user)[1]
+
+
+def has_category_access(user, category_id):
+    return category_id in visible_category_ids(user)
+
+
+def invalidate():
+    cache.delete(INDEX_KEY)
+
+
+def invalidate_users(user_ids):
+    cache.delete_many([_user_groups_key(user_id) for user_id in user_ids])
@@ -1,12 +1,43 @@
-from djangobb_forum.models import Ban
+from django.core.cache import cache
+
+from djangobb_forum.models import Forum
+from djangobb_forum.bans import is_banned
+
+MODERATORS_CACHE_TIMEOUT = 24 * 60 * 60
+
 
 def unbanned_user_requirement(user):
     """
     Checks that user is authenticated and not in ban list
     """
-    return user.is_authenticated() and not Ban.objects.filter(user=user).exists()
+    return user.is_authenticated() and not is_banned(user)
 
 
-def isa_forum_moderator(forum, user):
-    return user.has_perm('djangobb_forum.can_moderate_forum') or user in forum.moderators.all()
+def _moderated_forums_key(user_id):
+    return 'djangobb_moderated_forums_%d' % user_id
+
+
+def moderated_forum_ids(user):
+    """
+    Return frozenset of ids of forums where user is in moderators.
+    Loaded once per request and cached between requests.
+    """
+    if not user.is_authenticated():
+        return frozenset()
+    if not hasattr(user, '_djangobb_moderated_forums'):
+        key = _moderated_forums_key(user.id)
+        forum_ids = cache.get(key)
+        if forum_ids is None:
+            forum_ids = frozenset(Forum.moderators.through.objects.filter(user__id=user.id)\
+                                  .values_list('forum', flat=True))
+            cache.set(key, forum_ids, MODERATORS_CACHE_TIMEOUT)
+        user._djangobb_moderated_forums = forum_ids
+    return user._djangobb_moderated_forums
+
 
+def invalidate_moderators(user_ids):
+    cache.delete_many([_moderated_forums_key(user_id) for user_id in user_ids])
+
+
+def isa_forum_moderator(forum, user):
+    return forum.id in moderated_forum_ids(user) or user.has_perm('djangobb_forum.can_moderate_forum')
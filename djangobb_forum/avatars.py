@@ -0,0 +1,163 @@
+"""
+Renditions of uploaded avatars.
+
+The uploaded image is stored as it is and scaled to every size of
+DJANGOBB_AVATAR_SIZES, in the request or, with DJANGOBB_AVATAR_BACKGROUND,
+later by the djangobb_process_avatars command. A placeholder is shown
+until the renditions are ready, or when making them failed.
+"""
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.utils.html import escape
+
+from djangobb_forum.models import Profile
+from djangobb_forum import settings as forum_settings
+
+# values of Profile.avatar_state, avatars uploaded before renditions
+# were made are already scaled and shown as they are
+ORIGINAL = 0
+PENDING = 1
+READY = 2
+FAILED = 3
+
+logger = logging.getLogger(__name__)
+
+_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+def rendition_name(name, size):
+    """
+    Return storage name of the rendition of the avatar with given name.
+    """
+    return '%s_%d%s' % (os.path.splitext(name)[0], size,
+                        _EXTENSIONS.get(forum_settings.AVATAR_FORMAT, '.img'))
+
+
+def _pick(size):
+    sizes = sorted(forum_settings.AVATAR_SIZES)
+    for rendition_size in sizes:
+        if rendition_size >= size:
+            return rendition_size
+    return sizes[-1]
+
+
+def img(profile, size=None):
+    """
+    Return <img> tag with the avatar of the profile, fitting a ``size``
+    pixels square and its double on high density screens.
+    """
+    size = size or forum_settings.AVATAR_WIDTH
+    if profile.avatar_state == ORIGINAL:
+        return '<img src="%s" />' % escape(profile.avatar.url)
+    if profile.avatar_state in (PENDING, FAILED):
+        return '<img src="%s" width="%d" height="%d" alt="" />' % (
+            escape(forum_settings.AVATAR_PLACEHOLDER), size, size)
+    storage = profile.avatar.storage
+    src = _pick(size)
+    tag = '<img src="%s" width="%d" height="%d"' % (
+        escape(storage.url(rendition_name(profile.avatar.name, src))), size, size)
+    double = _pick(size * 2)
+    if double != src:
+        tag += ' srcset="%s 2x"' % escape(storage.url(rendition_name(profile.avatar.name, double)))
+    return tag + ' />'
+
+
+def _open(fileobj):
+    try:
+        import Image
+    except ImportError:
+        from PIL import Image
+    image = Image.open(fileobj)
+    # JPEGs are decoded right at a smaller scale
+    largest = max(forum_settings.AVATAR_SIZES)
+    image.draft('RGB', (largest, largest))
+    if forum_settings.AVATAR_FORMAT == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[3])
+        image = background
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    oldw, oldh = image.size
+    if oldw >= oldh:
+        x = int(round((oldw - oldh) / 2.0))
+        image = image.crop((x, 0, x + oldh, oldh))
+    else:
+        y = int(round((oldh - oldw) / 2.0))
+        image = image.crop((0, y, oldw, y + oldw))
+    return image, Image.ANTIALIAS
+
+
+def process(profile):
+    """
+    Make renditions of the avatar of the profile and mark it as ready.
+    Broken images are removed.
+    """
+    name = profile.avatar.name
+    storage = profile.avatar.storage
+    try:
+        image, resample = _open(storage.open(name))
+        renditions = []
+        # every size is scaled from the next larger one
+        for size in sorted(forum_settings.AVATAR_SIZES, reverse=True):
+            image = image.resize((size, size), resample)
+            content = StringIO()
+            image.save(content, format=forum_settings.AVATAR_FORMAT,
+                       quality=forum_settings.AVATAR_QUALITY, optimize=True)
+            renditions.append((rendition_name(name, size), content.getvalue()))
+    except (IOError, SyntaxError, ValueError):
+        Profile.objects.filter(pk=profile.pk, avatar=name).update(avatar='', avatar_state=ORIGINAL)
+        profile.avatar, profile.avatar_state = '', ORIGINAL
+        return False
+    for rendition, content in renditions:
+        if storage.exists(rendition):
+            storage.delete(rendition)
+        storage.save(rendition, ContentFile(content))
+    # unless another avatar was uploaded meanwhile
+    Profile.objects.filter(pk=profile.pk, avatar=name).update(avatar_state=READY)
+    profile.avatar_state = READY
+    return True
+
+
+def _process_all(state, batch_size, failed_state):
+    count = 0
+    last_id = 0
+    while True:
+        profiles = list(Profile.objects.filter(avatar_state=state, id__gt=last_id)
+                        .exclude(avatar='').order_by('id')[:batch_size])
+        if not profiles:
+            return count
+        last_id = profiles[-1].id
+        for profile in profiles:
+            try:
+                process(profile)
+            except Exception:
+                # image libraries raise all kinds of errors on malformed files
+                logger.exception('Failed to make renditions of avatar %s', profile.avatar.name)
+                Profile.objects.filter(pk=profile.pk, avatar=profile.avatar.name)\
+                    .update(avatar_state=failed_state)
+            count += 1
+
+
+def process_pending(batch_size=100):
+    """
+    Make renditions of all avatars waiting for them, avatars failing with
+    unexpected errors are marked as failed. Returns number of processed
+    avatars.
+    """
+    return _process_all(PENDING, batch_size, FAILED)
+
+
+def process_ready(batch_size=100):
+    """
+    Make renditions of avatars that have them again, e.g. after changing
+    sizes. The old renditions are shown meanwhile and kept on errors.
+    Returns number of processed avatars.
+    """
+    return _process_all(READY, batch_size, READY)
@@ -0,0 +1,65 @@
+"""
+Cached lookup of user bans.
+
+The ban of a user is memoized on the user instance for the lifetime of
+the request and kept in the cache between requests. Cached entries are
+dropped when a Ban is saved or deleted, bans past their ``ban_end``
+are treated as lifted.
+"""
+from datetime import datetime
+
+from django.core.cache import cache
+
+from djangobb_forum.models import Ban
+from djangobb_forum import settings as forum_settings
+
+# cached value of users without ban, None can't be told apart from a miss
+NOT_BANNED = 0
+
+
+def _key(user_id):
+    return 'djangobb_ban_%d' % user_id
+
+
+def _timeout(ban):
+    timeout = forum_settings.BAN_CACHE_TIMEOUT
+    if ban and ban.ban_end:
+        left = ban.ban_end - datetime.now()
+        timeout = min(timeout, left.days * 24 * 60 * 60 + left.seconds + 1)
+    return max(timeout, 1)
+
+
+def _fetch(user_id):
+    ban = cache.get(_key(user_id))
+    if ban is None:
+        try:
+            ban = Ban.objects.get(user__id=user_id)
+        except Ban.DoesNotExist:
+            ban = NOT_BANNED
+        cache.set(_key(user_id), ban, _timeout(ban))
+    return ban or None
+
+
+def get_ban(user):
+    """
+    Return active Ban of the user or None.
+    """
+    if not user.is_authenticated():
+        return None
+    if not hasattr(user, '_djangobb_ban'):
+        ban = _fetch(user.id)
+        if ban and ban.ban_end and ban.ban_end <= datetime.now():
+            ban = None
+        user._djangobb_ban = ban
+        if ban:
+            # ``user.ban`` returns it without a query
+            user._ban_cache = ban
+    return user._djangobb_ban
+
+
+def is_banned(user):
+    return get_ban(user) is not None
+
+
+def invalidate(user_id):
+    cache.delete(_key(user_id))
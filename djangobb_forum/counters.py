@@ -0,0 +1,275 @@
+"""
+Incremental maintenance of the denormalized counters on Forum, Topic and Profile.
+
+Every change is applied as an atomic F() delta in a single UPDATE per row,
+so the cost of posting does not grow with the size of the forum.
+"""
+from datetime import datetime
+import atexit
+
+from django.db import transaction
+from django.db.models import F, Count, Sum, Max
+
+from djangobb_forum.models import Forum, Topic, Post, Profile, Reputation
+from djangobb_forum.rerender import update_rows
+from djangobb_forum.util import PeriodicBuffer
+from djangobb_forum import settings as forum_settings
+
+
+def _latest_forum_post_id(forum_id):
+    try:
+        return Topic.objects.filter(forum__id=forum_id).latest().last_post_id
+    except Topic.DoesNotExist:
+        return None
+
+
+def _latest_topic_post_id(topic_id):
+    try:
+        return Post.objects.filter(topic__id=topic_id).latest().id
+    except Post.DoesNotExist:
+        return None
+
+
+def posts_by_user(posts):
+    """
+    Return list of (user_id, post count) pairs for the given posts queryset.
+    """
+    return list(posts.values_list('user').annotate(count=Count('id')).order_by())
+
+
+def topic_created(topic):
+    Forum.objects.filter(pk=topic.forum_id).update(topic_count=F('topic_count') + 1)
+
+
+def post_created(post):
+    now = datetime.now()
+    topic = post.topic
+    profile = post.user.forum_profile
+    Topic.objects.filter(pk=topic.id).update(post_count=F('post_count') + 1,
+                                             last_post=post, updated=now)
+    # the incremented counter is the position of the new post
+    post.position = Topic.objects.filter(pk=topic.id).values_list('post_count', flat=True)[0]
+    Post.objects.filter(pk=post.id).update(position=post.position)
+    Forum.objects.filter(pk=topic.forum_id).update(post_count=F('post_count') + 1,
+                                                   last_post=post, updated=now)
+    Profile.objects.filter(pk=profile.pk).update(post_count=F('post_count') + 1)
+    # keep already loaded instances in step with the database
+    topic.post_count += 1
+    topic.last_post = post
+    topic.updated = now
+    profile.post_count += 1
+
+
+def post_deleted(topic, post_id, user_id, position):
+    """
+    Called after a non-head post has been removed from its topic.
+    """
+    Topic.objects.filter(pk=topic.id).update(post_count=F('post_count') - 1)
+    if position:
+        Post.objects.filter(topic__id=topic.id, position__gt=position)\
+            .update(position=F('position') - 1)
+    Forum.objects.filter(pk=topic.forum_id).update(post_count=F('post_count') - 1)
+    Profile.objects.filter(user__id=user_id).update(post_count=F('post_count') - 1)
+    if topic.last_post_id in (None, post_id):
+        Topic.objects.filter(pk=topic.id).update(last_post=_latest_topic_post_id(topic.id))
+    if not Forum.objects.filter(pk=topic.forum_id, last_post__isnull=False).exists():
+        Forum.objects.filter(pk=topic.forum_id).update(last_post=_latest_forum_post_id(topic.forum_id))
+
+
+def topic_deleted(topic, user_posts):
+    """
+    Called after the topic and all its posts have been removed.
+    ``user_posts`` is the result of ``posts_by_user`` taken before deletion.
+    """
+    post_count = sum(count for user_id, count in user_posts)
+    Forum.objects.filter(pk=topic.forum_id).update(topic_count=F('topic_count') - 1,
+                                                   post_count=F('post_count') - post_count)
+    for user_id, count in user_posts:
+        Profile.objects.filter(user__id=user_id).update(post_count=F('post_count') - count)
+    if not Forum.objects.filter(pk=topic.forum_id, last_post__isnull=False).exists():
+        Forum.objects.filter(pk=topic.forum_id).update(last_post=_latest_forum_post_id(topic.forum_id))
+
+
+def topic_moved(topic, from_forum, to_forum):
+    Forum.objects.filter(pk=from_forum.id).update(topic_count=F('topic_count') - 1,
+                                                  post_count=F('post_count') - topic.post_count)
+    Forum.objects.filter(pk=to_forum.id).update(topic_count=F('topic_count') + 1,
+                                                post_count=F('post_count') + topic.post_count)
+    for forum in (from_forum, to_forum):
+        Forum.objects.filter(pk=forum.id).update(last_post=_latest_forum_post_id(forum.id))
+
+
+def _reputation_deltas(sign, delta):
+    return {'reply_total': F('reply_total') + sign * delta,
+            'reply_count_plus': F('reply_count_plus') + (sign > 0 and delta or 0),
+            'reply_count_minus': F('reply_count_minus') + (sign < 0 and delta or 0)}
+
+
+def reputation_created(reputation):
+    if not Profile.objects.filter(user__id=reputation.to_user_id)\
+            .update(**_reputation_deltas(reputation.sign, 1)):
+        # profiles are created on first access
+        reputation.to_user.forum_profile
+        rebuild_reputation(reputation.to_user_id)
+
+
+def reputation_deleted(reputation):
+    Profile.objects.filter(user__id=reputation.to_user_id)\
+        .update(**_reputation_deltas(reputation.sign, -1))
+
+
+def _reputation_totals(user_ids):
+    """
+    Return dict of user id -> (reply_total, reply_count_plus, reply_count_minus).
+    """
+    totals = dict((user_id, [0, 0, 0]) for user_id in user_ids)
+    for row in Reputation.objects.filter(to_user__id__in=user_ids)\
+            .values('to_user', 'sign').annotate(count=Count('id')).order_by():
+        user_totals = totals[row['to_user']]
+        user_totals[0] += row['sign'] * row['count']
+        if row['sign'] > 0:
+            user_totals[1] += row['count']
+        elif row['sign'] < 0:
+            user_totals[2] += row['count']
+    return dict((user_id, tuple(user_totals)) for user_id, user_totals in totals.iteritems())
+
+
+def rebuild_reputation(user_id):
+    reply_total, reply_count_plus, reply_count_minus = _reputation_totals([user_id])[user_id]
+    Profile.objects.filter(user__id=user_id).update(reply_total=reply_total,
+        reply_count_plus=reply_count_plus, reply_count_minus=reply_count_minus)
+
+
+def _chunks(queryset, chunk_size):
+    """
+    Yield lists of primary keys of the queryset in ascending order.
+    """
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last_id).order_by('pk')\
+                   .values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            break
+        yield ids
+        last_id = ids[-1]
+
+
+@transaction.commit_on_success
+def _rebuild_topic_chunk(ids):
+    fixed = 0
+    stats = dict((row['topic'], (row['post_count'], row['last_post']))
+                 for row in Post.objects.filter(topic__id__in=ids).values('topic')\
+                     .annotate(post_count=Count('id'), last_post=Max('id')).order_by())
+    for topic_id, post_count, last_post_id in Topic.objects.filter(id__in=ids)\
+            .values_list('id', 'post_count', 'last_post'):
+        actual = stats.get(topic_id, (0, None))
+        if (post_count, last_post_id) != actual:
+            Topic.objects.filter(pk=topic_id).update(post_count=actual[0], last_post=actual[1])
+            fixed += 1
+    return fixed
+
+
+def rebuild_forum(forum_id, chunk_size=1000):
+    """
+    Recompute counters and last posts of the forum and all its topics.
+    Returns (number of corrected topics, number of corrected forums).
+    """
+    fixed_topics = 0
+    for ids in _chunks(Topic.objects.filter(forum__id=forum_id), chunk_size):
+        fixed_topics += _rebuild_topic_chunk(ids)
+    actual = Topic.objects.filter(forum__id=forum_id).aggregate(
+        topic_count=Count('id'), post_count=Sum('post_count'), last_post=Max('last_post'))
+    actual['post_count'] = actual['post_count'] or 0
+    current = Forum.objects.filter(pk=forum_id).values('topic_count', 'post_count', 'last_post')[0]
+    if current != actual:
+        Forum.objects.filter(pk=forum_id).update(**actual)
+        return fixed_topics, 1
+    return fixed_topics, 0
+
+
+def rebuild_profiles(chunk_size=1000):
+    """
+    Recompute post counts and reputation totals of all profiles.
+    Returns number of corrected profiles.
+    """
+    fixed = 0
+    for ids in _chunks(Profile.objects.all(), chunk_size):
+        fixed += _rebuild_profile_chunk(ids)
+    return fixed
+
+
+@transaction.commit_on_success
+def _rebuild_profile_chunk(ids):
+    fixed = 0
+    profiles = list(Profile.objects.filter(id__in=ids).values_list('id', 'user', 'post_count',
+                    'reply_total', 'reply_count_plus', 'reply_count_minus'))
+    user_ids = [row[1] for row in profiles]
+    counts = dict(Post.objects.filter(user__id__in=user_ids)\
+                  .values_list('user').annotate(Count('id')).order_by())
+    reputations = _reputation_totals(user_ids)
+    for row in profiles:
+        pk, user_id = row[:2]
+        actual = (counts.get(user_id, 0),) + reputations[user_id]
+        if row[2:] != actual:
+            Profile.objects.filter(pk=pk).update(post_count=actual[0], reply_total=actual[1],
+                reply_count_plus=actual[2], reply_count_minus=actual[3])
+            fixed += 1
+    return fixed
+
+
+def rebuild_positions(chunk_size=100):
+    """
+    Renumber posts of all topics by (created, id), every chunk of topics
+    in its own transaction. Returns number of corrected posts.
+    """
+    fixed = 0
+    for ids in _chunks(Topic.objects.all(), chunk_size):
+        fixed += _rebuild_position_chunk(ids)
+    return fixed
+
+
+@transaction.commit_on_success
+def _rebuild_position_chunk(topic_ids):
+    changed = []
+    position = 0
+    current_topic = None
+    for post_id, topic_id, current in Post.objects.filter(topic__id__in=topic_ids)\
+            .order_by('topic__id', 'created', 'id').values_list('id', 'topic', 'position'):
+        if topic_id != current_topic:
+            current_topic, position = topic_id, 0
+        position += 1
+        if current != position:
+            changed.append((post_id, position))
+    update_rows(Post, 'position', changed)
+    return len(changed)
+
+
+class ViewsBuffer(PeriodicBuffer):
+    """
+    In-process aggregator of topic views. Increments are written back
+    at most once per ``interval`` seconds with one UPDATE per distinct delta.
+
+    Views are counted approximately: pending views are written by the
+    next view after the interval or at normal exit of the process, so an
+    idle process keeps them until then, and a killed one (SIGKILL, OOM
+    killer, uwsgi harakiri) loses up to ``interval`` seconds of them.
+    Other processes do not see them. Set the interval to 0 for exact
+    counts at the cost of an UPDATE per view.
+    """
+
+    def merge(self, topic_id, count):
+        self.pending[topic_id] = self.pending.get(topic_id, 0) + count
+
+    def get(self, topic_id):
+        return self.pending.get(topic_id, 0)
+
+    def write(self, pending):
+        by_delta = {}
+        for topic_id, delta in pending.iteritems():
+            by_delta.setdefault(delta, []).append(topic_id)
+        for delta, ids in by_delta.iteritems():
+            Topic.objects.filter(pk__in=ids).update(views=F('views') + delta)
+
+
+topic_views = ViewsBuffer(forum_settings.TOPIC_VIEWS_FLUSH_INTERVAL)
+atexit.register(topic_views.flush)
@@ -0,0 +1,123 @@
+"""
+Serving of stored files without reading them into memory.
+
+Files are streamed in fixed-size chunks, or handed off to the front-end
+server with DJANGOBB_ATTACHMENT_SENDFILE_HEADER. Single byte ranges and
+revalidation with ETag / If-None-Match are supported.
+"""
+import os
+import re
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.encoding import smart_str
+
+from djangobb_forum import settings as forum_settings
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileChunks(object):
+    """
+    Iterator over ``length`` bytes of the file from ``start``, read in
+    chunks. Closed by the WSGI server when the response is done.
+    """
+
+    def __init__(self, fileobj, start=0, length=None, chunk_size=CHUNK_SIZE):
+        self.fileobj = fileobj
+        self.remaining = length
+        self.chunk_size = chunk_size
+        if start:
+            fileobj.seek(start)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        size = self.chunk_size
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+        data = self.fileobj.read(size) if size else ''
+        if not data:
+            self.close()
+            raise StopIteration
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) of a single byte range, inclusive, None for a
+    missing or unsupported header (several ranges) and False for a range
+    which can't be satisfied.
+    """
+    match = _RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # the last ``end`` bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _etag_matches(header, etag):
+    return header.strip() == '*' or etag in [tag.strip() for tag in header.split(',')]
+
+
+def serve_file(request, path, content_type, filename, etag, inline=False):
+    """
+    Return response with the file at ``path``, sent as download with
+    given filename unless ``inline``. ``etag`` should change with the
+    contents of the file.
+    """
+    etag = '"%s"' % etag
+    if _etag_matches(request.META.get('HTTP_IF_NONE_MATCH', ''), etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    header = forum_settings.ATTACHMENT_SENDFILE_HEADER
+    if header:
+        # the front-end server sends the file, ranges included
+        response = HttpResponse(mimetype=content_type)
+        if header.lower() == 'x-accel-redirect':
+            relative = os.path.relpath(path, forum_settings.ATTACHMENT_SENDFILE_ROOT)
+            response[header] = smart_str(forum_settings.ATTACHMENT_SENDFILE_URL + relative)
+        else:
+            response[header] = smart_str(path)
+    else:
+        size = os.path.getsize(path)
+        byte_range = None
+        if 'HTTP_RANGE' in request.META:
+            if_range = request.META.get('HTTP_IF_RANGE')
+            if not if_range or if_range == etag:
+                byte_range = parse_range(request.META['HTTP_RANGE'], size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%d' % size
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = HttpResponse(FileChunks(open(path, 'rb'), start, end - start + 1),
+                                    mimetype=content_type, status=206)
+            response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = HttpResponse(FileChunks(open(path, 'rb'), 0, size), mimetype=content_type)
+            response['Content-Length'] = str(size)
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = '%s; filename="%s"' % (inline and 'inline' or 'attachment',
+                                                             smart_str(filename))
+    return response
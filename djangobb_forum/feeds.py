@@ -2,10 +2,11 @@ from django.contrib.syndication.views import Feed, FeedDoesNotExist
 from django.utils.feedgenerator import Atom1Feed
 from django.core.urlresolvers import reverse
 from django.utils.translation import ugettext_lazy as _
-from django.db.models import Q
 from django.http import Http404
 
 from djangobb_forum.models import Post, Topic, Forum, Category
+from djangobb_forum import access
+from djangobb_forum import rerender
 
 class ForumFeed(Feed):
     feed_type = Atom1Feed
@@ -27,16 +28,11 @@ class LastPosts(ForumFeed):
     description_template = 'djangobb_forumfeeds/posts_description.html'
 
     def get_object(self, request):
-        user_groups = request.user.groups.all()
-        if request.user.is_anonymous():
-            user_groups = []
-        allow_forums = Forum.objects.filter(
-                Q(category__groups__in=user_groups) | \
-                Q(category__groups__isnull=True))
-        return allow_forums
+        return access.visible_forum_ids(request.user)
 
     def items(self, allow_forums):
-        return Post.objects.filter(topic__forum__in=allow_forums).order_by('-created')[:15]
+        posts = Post.objects.filter(topic__forum__id__in=allow_forums).order_by('-created')[:15]
+        return rerender.load_html(posts)
 
 
 class LastTopics(ForumFeed):
@@ -46,16 +42,17 @@ class LastTopics(ForumFeed):
     description_template = 'djangobb_forum/feeds/topics_description.html'
 
     def get_object(self, request):
-        user_groups = request.user.groups.all()
-        if request.user.is_anonymous():
-            user_groups = []
-        allow_forums = Forum.objects.filter(
-                Q(category__groups__in=user_groups) | \
-                Q(category__groups__isnull=True))
-        return allow_forums
+        return access.visible_forum_ids(request.user)
 
     def items(self, allow_forums):
-        return Topic.objects.filter(forum__in=allow_forums).order_by('-created')[:15]
+        topics = list(Topic.objects.filter(forum__id__in=allow_forums).order_by('-created')[:15])
+        heads = rerender.load_html(Post.objects.filter(topic__id__in=[topic.id for topic in topics],
+                                                       position=1))
+        heads = dict((post.topic_id, post) for post in heads)
+        for topic in topics:
+            if topic.id in heads:
+                topic._head_cache = heads[topic.id]
+        return topics
 
 
 class LastPostsOnTopic(ForumFeed):
@@ -80,7 +77,8 @@ class LastPostsOnTopic(ForumFeed):
         return _('Latest posts on %s topic' % obj.name)
 
     def items(self, obj):
-        return Post.objects.filter(topic__id=obj.id).order_by('-created')[:15]
+        posts = Post.objects.filter(topic__id=obj.id).order_by('-created')[:15]
+        return rerender.load_html(posts)
 
 
 class LastPostsOnForum(ForumFeed):
@@ -105,7 +103,8 @@ class LastPostsOnForum(ForumFeed):
         return _('Latest posts on %s forum' % obj.name)
 
     def items(self, obj):
-        return Post.objects.filter(topic__forum__id=obj.id).order_by('-created')[:15]
+        posts = Post.objects.filter(topic__forum__id=obj.id).order_by('-created')[:15]
+        return rerender.load_html(posts)
 
 
 class LastPostsOnCategory(ForumFeed):
@@ -125,4 +124,5 @@ class LastPostsOnCategory(ForumFeed):
         return _('Latest posts on %s category' % obj.name)
 
     def items(self, obj):
-        return Post.objects.filter(topic__forum__category__id=obj.id).order_by('-created')[:15]
+        posts = Post.objects.filter(topic__forum__category__id=obj.id).order_by('-created')[:15]
+        return rerender.load_html(posts)
@@ -40,9 +40,14 @@ class AutoOneToOneField(OneToOneField):
         #    cls._meta.one_to_one_field = self
 
 
+# formats of images stored as uploaded
+IMAGE_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+
 class ExtendedImageField(models.ImageField):
     """
-    Extended ImageField that can resize image before saving it.
+    Extended ImageField that can resize image before saving it,
+    uploads are saved under random names.
     """
 
     def __init__(self, *args, **kwargs):
@@ -62,8 +67,39 @@ class ExtendedImageField(models.ImageField):
             salt = sha1(str(random.random())).hexdigest()[:5]
             fname =  sha1(salt + settings.SECRET_KEY).hexdigest() + '.png'
             data = SimpleUploadedFile(fname, content, data.content_type)
+        elif data and hasattr(data, 'content_type'):
+            # stored as uploaded under a random name, the extension is the
+            # detected format and never taken from the uploaded name
+            salt = sha1(str(random.random())).hexdigest()[:5]
+            fname = sha1(salt + settings.SECRET_KEY).hexdigest()
+            format, content = self.detect_format(data)
+            if content is None:
+                data.name = fname + IMAGE_EXTENSIONS[format]
+            else:
+                data = SimpleUploadedFile(fname + '.png', content, 'image/png')
         return super(ExtendedImageField, self).save_form_data(instance, data)
 
+    def detect_format(self, data):
+        """
+        Return (format, None) for images in one of IMAGE_EXTENSIONS, other
+        images are converted and returned as ('PNG', content).
+        """
+        try:
+            import Image
+        except ImportError:
+            from PIL import Image
+        data.seek(0)
+        image = Image.open(data)
+        format = image.format
+        if format in IMAGE_EXTENSIONS:
+            data.seek(0)
+            return format, None
+        if image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+            image = image.convert('RGBA')
+        string = StringIO()
+        image.save(string, format='PNG')
+        return 'PNG', string.getvalue()
+
     def resize_image(self, rawdata, width, height):
         """
         Resize image to fit it into (width, height) box.
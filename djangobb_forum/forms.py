@@ -1,16 +1,17 @@
 # -*- coding: utf-8 -*-
-import os.path
 from datetime import datetime
 
 from django import forms
-from django.conf import settings
 from django.contrib.auth.models import User
 from django.utils.translation import ugettext_lazy as _
 
 from djangobb_forum.models import Topic, Post, Profile, Reputation, Report, \
     Attachment
 from djangobb_forum import settings as forum_settings
-from djangobb_forum.util import convert_text_to_html, set_language
+from djangobb_forum import uploads
+from djangobb_forum import avatars
+from djangobb_forum.util import set_language
+from djangobb_forum.rendering import render_html
 
 
 SORT_USER_BY_CHOICES = (
@@ -115,14 +116,8 @@ class AddPostForm(forms.ModelForm):
 
     def save_attachment(self, post, memfile):
         if memfile:
-            obj = Attachment(size=memfile.size, content_type=memfile.content_type,
-                             name=memfile.name, post=post)
-            dir = os.path.join(settings.MEDIA_ROOT, forum_settings.ATTACHMENT_UPLOAD_TO)
-            fname = '%d.0' % post.id
-            path = os.path.join(dir, fname)
-            file(path, 'wb').write(memfile.read())
-            obj.path = fname
-            obj.save()
+            Attachment.objects.create(size=memfile.size, content_type=memfile.content_type,
+                                      name=memfile.name, post=post, path=uploads.store(memfile))
 
 
 class EditPostForm(forms.ModelForm):
@@ -236,7 +231,7 @@ class PersonalityProfileForm(forms.ModelForm):
 
     def save(self, commit=True):
         profile = super(PersonalityProfileForm, self).save(commit=False)
-        profile.signature_html = convert_text_to_html(profile.signature, self.profile.markup)
+        profile.signature_html = render_html(profile.signature, self.profile.markup)
         if commit:
             profile.save()
         return profile
@@ -255,7 +250,7 @@ class DisplayProfileForm(forms.ModelForm):
 class PrivacyProfileForm(forms.ModelForm):
     class Meta:
         model = Profile
-        fields = ['privacy_permission']
+        fields = ['privacy_permission', 'subscription_digest']
 
     def __init__(self, *args, **kwargs):
         extra_args = kwargs.pop('extra_args', {})
@@ -263,6 +258,9 @@ class PrivacyProfileForm(forms.ModelForm):
         self.fields['privacy_permission'].widget = forms.RadioSelect(  
                                                     choices=self.fields['privacy_permission'].choices
                                                     )
+        self.fields['subscription_digest'].widget = forms.RadioSelect(
+                                                    choices=self.fields['subscription_digest'].choices
+                                                    )
 
 
 class UploadAvatarForm(forms.ModelForm):
@@ -274,6 +272,16 @@ class UploadAvatarForm(forms.ModelForm):
         extra_args = kwargs.pop('extra_args', {})
         super(UploadAvatarForm, self).__init__(*args, **kwargs)
 
+    def save(self, commit=True):
+        profile = super(UploadAvatarForm, self).save(commit=False)
+        if 'avatar' in self.changed_data and profile.avatar:
+            profile.avatar_state = avatars.PENDING
+        if commit:
+            profile.save()
+            if profile.avatar_state == avatars.PENDING and not forum_settings.AVATAR_BACKGROUND:
+                avatars.process(profile)
+        return profile
+
 
 class UserSearchForm(forms.Form):
     username = forms.CharField(required=False, label=_('Username'))
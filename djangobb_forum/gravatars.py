@@ -0,0 +1,69 @@
+"""
+Memoized gravatar URLs.
+
+URLs are keyed by (email, secure flag, size) and kept in a bounded
+in-process LRU. ``load_users`` attaches both variants of the URL to
+user instances, so templates only pick one. URLs of changed emails are
+not looked up any more and age out of the LRU.
+"""
+from hashlib import md5
+import urllib
+
+from django.utils.encoding import smart_str
+
+from djangobb_forum.util import LRUCache
+from djangobb_forum import settings as forum_settings
+
+
+def default_size():
+    return max(forum_settings.AVATAR_WIDTH, forum_settings.AVATAR_HEIGHT)
+
+
+def make_url(email, secure, size):
+    url = 'https://secure.gravatar.com/avatar/%s?' if secure \
+            else 'http://www.gravatar.com/avatar/%s?'
+    url = url % md5(smart_str(email.lower())).hexdigest()
+    url += urllib.urlencode({
+        'size': size,
+        'default': forum_settings.GRAVATAR_DEFAULT,
+    })
+    return url.replace('&', '&amp;')
+
+
+class GravatarCache(object):
+
+    def __init__(self, size):
+        self.items = LRUCache(size)
+
+    def url(self, email, secure=False, size=None):
+        """
+        Return gravatar URL of the email, escaped for HTML.
+        """
+        key = (email or '', bool(secure), size or default_size())
+        url = self.items.get(key)
+        if url is None:
+            url = make_url(*key)
+            self.items.set(key, url)
+        return url
+
+    def user_urls(self, user, size=None):
+        """
+        Return (plain, secure) pair of gravatar URLs of the user.
+        """
+        return (self.url(user.email, False, size), self.url(user.email, True, size))
+
+    def clear(self):
+        self.items.clear()
+
+
+cache = GravatarCache(forum_settings.GRAVATAR_CACHE_SIZE)
+
+
+def load_users(users):
+    """
+    Attach ``user.forum_gravatar``, the pair of plain and secure URLs,
+    to given users.
+    """
+    if forum_settings.GRAVATAR_SUPPORT:
+        for user in users:
+            user.forum_gravatar = cache.user_urls(user)
@@ -0,0 +1,23 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangobb_forum import uploads, thumbnails
+
+
+class Command(BaseCommand):
+
+    option_list = BaseCommand.option_list + (
+        make_option('--min-age', type='int', dest='min_age', default=60 * 60,
+                    help=u'Keep files modified less than this many seconds ago'),
+    )
+    help = u'Remove attachment files and thumbnails no attachment refers to'
+
+    def handle(self, *args, **options):
+        if options['min_age'] < 0:
+            raise CommandError('Invalid options')
+
+        count, size = uploads.remove_orphans(options['min_age'])
+        self.stdout.write(u'Removed %d files, %d bytes\n' % (count, size))
+        count, size = thumbnails.remove_orphans(options['min_age'])
+        self.stdout.write(u'Removed %d thumbnails, %d bytes\n' % (count, size))
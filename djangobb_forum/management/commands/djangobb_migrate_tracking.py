@@ -0,0 +1,47 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from djangobb_forum.models import Topic, PostTracking, TopicTracking
+
+# topics per query, keeps number of query parameters under backends limits
+CHUNK_SIZE = 250
+
+
+class Command(BaseCommand):
+
+    option_list = BaseCommand.option_list + (
+        make_option('--clear', action='store_true', dest='clear', default=False,
+                    help=u'Remove converted data from PostTracking.topics'),
+    )
+    help = u'Convert PostTracking.topics JSON data into TopicTracking rows'
+
+    def handle(self, *args, **options):
+        converted = 0
+        for tracking in PostTracking.objects.exclude(topics=None).iterator():
+            converted += self.convert(tracking, options['clear'])
+        self.stdout.write(u'Converted %d read topics\n' % converted)
+
+    @transaction.commit_on_success
+    def convert(self, tracking, clear):
+        if not isinstance(tracking.topics, dict):
+            return 0
+        read_posts = dict((int(topic_id), last_post_id) for topic_id, last_post_id
+                          in tracking.topics.iteritems())
+        read_topics = sorted(read_posts)
+        for i in xrange(0, len(read_topics), CHUNK_SIZE):
+            chunk = read_topics[i:i + CHUNK_SIZE]
+            existing = dict(TopicTracking.objects.filter(user__id=tracking.user_id, topic__id__in=chunk)\
+                            .values_list('topic', 'last_read_post'))
+            for topic_id in Topic.objects.filter(id__in=chunk).values_list('id', flat=True):
+                last_post_id = read_posts[topic_id]
+                if topic_id not in existing:
+                    TopicTracking.objects.create(user_id=tracking.user_id, topic_id=topic_id,
+                                                 last_read_post=last_post_id)
+                elif last_post_id > existing[topic_id]:
+                    TopicTracking.objects.filter(user__id=tracking.user_id, topic__id=topic_id)\
+                        .update(last_read_post=last_post_id)
+        if clear:
+            PostTracking.objects.filter(pk=tracking.pk).update(topics=None)
+        return len(read_posts)
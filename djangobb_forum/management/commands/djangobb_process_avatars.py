@@ -0,0 +1,27 @@
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangobb_forum import avatars
+
+
+class Command(BaseCommand):
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size', default=100,
+                    help=u'Number of profiles fetched at once'),
+        make_option('--all', action='store_true', dest='all', default=False,
+                    help=u'Make renditions of all avatars again, e.g. after changing sizes'),
+    )
+    help = u'Make renditions of uploaded avatars'
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Invalid options')
+
+        start = time.time()
+        count = avatars.process_pending(options['batch_size'])
+        if options['all']:
+            count += avatars.process_ready(options['batch_size'])
+        self.stdout.write(u'Processed %d avatars in %.1fs\n' % (count, time.time() - start))
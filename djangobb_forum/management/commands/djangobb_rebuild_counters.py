@@ -0,0 +1,48 @@
+from optparse import make_option
+from multiprocessing import Pool
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from djangobb_forum.models import Forum
+from djangobb_forum import counters
+
+
+def _rebuild_forum(args):
+    return counters.rebuild_forum(*args)
+
+
+class Command(BaseCommand):
+
+    option_list = BaseCommand.option_list + (
+        make_option('--processes', type='int', dest='processes', default=1,
+                    help=u'Number of worker processes, each rebuilds one forum at a time'),
+        make_option('--chunk-size', type='int', dest='chunk_size', default=1000,
+                    help=u'Number of rows aggregated per query'),
+    )
+    help = u'Recompute post/topic counters and last posts of forums and topics, post counts and reputation of profiles'
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        chunk_size = options['chunk_size']
+        if processes < 1 or chunk_size < 1:
+            raise CommandError('Invalid options')
+
+        start = time.time()
+        tasks = [(forum_id, chunk_size) for forum_id in Forum.objects.values_list('id', flat=True)]
+        if processes > 1:
+            # workers must not share the parent's database connection
+            connection.close()
+            pool = Pool(processes)
+            results = pool.map(_rebuild_forum, tasks)
+            pool.close()
+            pool.join()
+        else:
+            results = map(_rebuild_forum, tasks)
+        fixed_topics = sum(topics for topics, forums in results)
+        fixed_forums = sum(forums for topics, forums in results)
+        fixed_profiles = counters.rebuild_profiles(chunk_size)
+
+        self.stdout.write(u'Corrected %d topics, %d forums, %d profiles in %.1fs\n' % (
+            fixed_topics, fixed_forums, fixed_profiles, time.time() - start))
@@ -0,0 +1,24 @@
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangobb_forum import counters
+
+
+class Command(BaseCommand):
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', dest='chunk_size', default=100,
+                    help=u'Number of topics renumbered per transaction'),
+    )
+    help = u'Renumber positions of posts in their topics'
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('Invalid options')
+
+        start = time.time()
+        fixed = counters.rebuild_positions(chunk_size)
+        self.stdout.write(u'Corrected %d posts in %.1fs\n' % (fixed, time.time() - start))
@@ -0,0 +1,38 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangobb_forum import rerender
+
+
+class Command(BaseCommand):
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', dest='chunk_size', default=500,
+                    help=u'Number of rows rendered by a worker at once'),
+        make_option('--processes', type='int', dest='processes', default=None,
+                    help=u'Number of worker processes, CPU count by default'),
+        make_option('--checkpoint', dest='checkpoint', default=None,
+                    help=u'File to resume an interrupted run from'),
+    )
+    help = u'Render HTML of posts and signatures again, e.g. after changing smiles or markup libraries'
+    args = u'[posts] [signatures]'
+
+    def handle(self, *args, **options):
+        names = [target[0] for target in rerender.TARGETS]
+        if options['chunk_size'] < 1 or any(arg not in names for arg in args):
+            raise CommandError('Invalid options')
+        processes = options['processes']
+        if processes is not None and processes < 1:
+            raise CommandError('Invalid options')
+
+        checkpoint = rerender.Checkpoint(options['checkpoint'])
+        for name in names:
+            if checkpoint.get(name):
+                self.stdout.write(u'Resuming %s after id %d\n' % (name, checkpoint.get(name)))
+
+        def report(name, done, changed, seconds):
+            self.stdout.write(u'%s: %d rendered, %d changed, %.1f per second\n'
+                              % (name, done, changed, done / max(seconds, 0.001)))
+
+        rerender.rerender(args, options['chunk_size'], processes, checkpoint, report)
@@ -0,0 +1,25 @@
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangobb_forum.subscription import send_digests, DIGEST_PERIODS
+
+
+class Command(BaseCommand):
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size', default=100,
+                    help=u'Number of users whose digests are built at once'),
+    )
+    help = u'Send digests of new replies to subscribed topics'
+    args = u'hourly|daily'
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if len(args) != 1 or args[0] not in DIGEST_PERIODS or batch_size < 1:
+            raise CommandError('Invalid options')
+
+        start = time.time()
+        sent = send_digests(args[0], batch_size)
+        self.stdout.write(u'Sent %d digests in %.1fs\n' % (sent, time.time() - start))
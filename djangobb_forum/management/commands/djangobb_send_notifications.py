@@ -0,0 +1,24 @@
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangobb_forum.subscription import send_queued
+
+
+class Command(BaseCommand):
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size', default=100,
+                    help=u'Number of queued posts sent over one connection'),
+    )
+    help = u'Send queued notifications of topic subscribers'
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Invalid options')
+
+        start = time.time()
+        sent = send_queued(batch_size)
+        self.stdout.write(u'Sent %d messages in %.1fs\n' % (sent, time.time() - start))
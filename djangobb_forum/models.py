@@ -7,10 +7,10 @@ from django.db import models
 from django.contrib.auth.models import User, Group
 from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 
 from djangobb_forum.fields import AutoOneToOneField, ExtendedImageField, JSONField
-from djangobb_forum.util import smiles, convert_text_to_html
+from djangobb_forum.rendering import render_html, FINGERPRINT
 from djangobb_forum import settings as forum_settings
 
 if 'south' in settings.INSTALLED_APPS:
@@ -41,6 +41,12 @@ PRIVACY_CHOICES = (
     (2, _(u'Hide your e-mail address and disallow form e-mail.')),
 )
 
+DIGEST_CHOICES = (
+    ('immediate', _(u'Immediately')),
+    ('hourly', _(u'Hourly digest')),
+    ('daily', _(u'Daily digest')),
+)
+
 MARKUP_CHOICES = [('bbcode', 'bbcode')]
 try:
     import markdown
@@ -82,13 +88,7 @@ class Category(models.Model):
         return Post.objects.filter(topic__forum__category__id=self.id).select_related()
 
     def has_access(self, user):
-        if self.groups.exists():
-            if user.is_authenticated(): 
-                    if not self.groups.filter(user__pk=user.id).exists():
-                        return False
-            else:
-                return False
-        return True
+        return access.has_category_access(user, self.id)
 
 
 class Forum(models.Model):
@@ -124,7 +124,7 @@ class Topic(models.Model):
     forum = models.ForeignKey(Forum, related_name='topics', verbose_name=_('Forum'))
     name = models.CharField(_('Subject'), max_length=255)
     created = models.DateTimeField(_('Created'), auto_now_add=True)
-    updated = models.DateTimeField(_('Updated'), null=True)
+    updated = models.DateTimeField(_('Updated'), default=datetime.now)
     user = models.ForeignKey(User, verbose_name=_('User'))
     views = models.IntegerField(_('Views count'), blank=True, default=0)
     sticky = models.BooleanField(_('Sticky'), blank=True, default=False)
@@ -143,29 +143,19 @@ class Topic(models.Model):
         return self.name
 
     def delete(self, *args, **kwargs):
-        try:
-            last_post = self.posts.latest()
-            last_post.last_forum_post.clear()
-        except Post.DoesNotExist:
-            pass
-        else:
-            last_post.last_forum_post.clear()
-        forum = self.forum
+        user_posts = counters.posts_by_user(self.posts.all())
+        Forum.objects.filter(last_post__topic__id=self.id).update(last_post=None)
         super(Topic, self).delete(*args, **kwargs)
-        try:
-            forum.last_post = Topic.objects.filter(forum__id=forum.id).latest().last_post
-        except Topic.DoesNotExist:
-            forum.last_post = None
-        forum.topic_count = Topic.objects.filter(forum__id=forum.id).count()
-        forum.post_count = Post.objects.filter(topic__forum__id=forum.id).count()
-        forum.save()
+        counters.topic_deleted(self, user_posts)
 
     @property
     def head(self):
-        try:
-            return self.posts.select_related().order_by('created')[0]
-        except IndexError:
-            return None
+        if not hasattr(self, '_head_cache'):
+            try:
+                self._head_cache = self.posts.select_related().order_by('created')[0]
+            except IndexError:
+                self._head_cache = None
+        return self._head_cache
 
     @property
     def reply_count(self):
@@ -180,20 +170,7 @@ class Topic(models.Model):
         #if last_read > last_read - don't check topics
         if tracking.last_read and (tracking.last_read > self.last_post.created):
             return
-        if isinstance(tracking.topics, dict):
-            #clear topics if len > 5Kb and set last_read to current time
-            if len(tracking.topics) > 5120:
-                tracking.topics = None
-                tracking.last_read = datetime.now()
-                tracking.save()
-            #update topics if exist new post or does't exist in dict
-            if self.last_post_id > tracking.topics.get(str(self.id), 0):
-                tracking.topics[str(self.id)] = self.last_post_id
-                tracking.save()
-        else:
-            #initialize topic tracking dict
-            tracking.topics = {self.id: self.last_post_id}
-            tracking.save()
+        read_tracking.mark_read(user, self)
 
 
 class Post(models.Model):
@@ -206,6 +183,8 @@ class Post(models.Model):
     body = models.TextField(_('Message'))
     body_html = models.TextField(_('HTML version'))
     user_ip = models.IPAddressField(_('User IP'), blank=True, null=True)
+    position = models.IntegerField(_('Position in topic'), blank=True, default=0)
+    render_version = models.CharField(_('Renderer version'), max_length=8, blank=True, default='')
 
 
     class Meta:
@@ -215,41 +194,39 @@ class Post(models.Model):
         verbose_name_plural = _('Posts')
 
     def save(self, *args, **kwargs):
-        self.body_html = convert_text_to_html(self.body, self.markup) 
-        if forum_settings.SMILES_SUPPORT and self.user.forum_profile.show_smilies:
-            self.body_html = smiles(self.body_html)
+        self.body_html = render_html(self.body, self.markup,
+            forum_settings.SMILES_SUPPORT and self.user.forum_profile.show_smilies)
+        self.render_version = FINGERPRINT
         super(Post, self).save(*args, **kwargs)
 
+    @property
+    def html(self):
+        """
+        HTML of the body for templates. In lazy rendering mode stale HTML
+        is rendered again, pages of posts do it in one go with prefetch.
+        """
+        if forum_settings.LAZY_RENDERING and self.render_version != FINGERPRINT:
+            from djangobb_forum.rerender import refresh_posts
+            refresh_posts([self])
+        return self.body_html
+
 
     def delete(self, *args, **kwargs):
         self_id = self.id
-        head_post_id = self.topic.posts.order_by('created')[0].id
-        forum = self.topic.forum
         topic = self.topic
-        profile = self.user.forum_profile
+        #if post was first in topic - remove whole topic
+        if self.position:
+            is_head = self.position == 1
+        else:
+            # not numbered yet, see djangobb_repair_positions
+            is_head = topic.posts.order_by('created', 'id')[0].id == self_id
+        if is_head:
+            topic.delete()
+            return
         self.last_topic_post.clear()
         self.last_forum_post.clear()
         super(Post, self).delete(*args, **kwargs)
-        #if post was last in topic - remove topic
-        if self_id == head_post_id:
-            topic.delete()
-        else:
-            try:
-                topic.last_post = Post.objects.filter(topic__id=topic.id).latest()
-            except Post.DoesNotExist:
-                topic.last_post = None
-            topic.post_count = Post.objects.filter(topic__id=topic.id).count()
-            topic.save()
-        try:
-            forum.last_post = Post.objects.filter(topic__forum__id=forum.id).latest()
-        except Post.DoesNotExist:
-            forum.last_post = None
-        #TODO: for speedup - save/update only changed fields
-        forum.post_count = Post.objects.filter(topic__forum__id=forum.id).count()
-        forum.topic_count = Topic.objects.filter(forum__id=forum.id).count()
-        forum.save()
-        profile.post_count = Post.objects.filter(user__id=self.user_id).count()
-        profile.save()
+        counters.post_deleted(topic, self_id, self.user_id, self.position)
 
     @models.permalink
     def get_absolute_url(self):
@@ -280,18 +257,6 @@ class Reputation(models.Model):
         return u'T[%d], FU[%d], TU[%d]: %s' % (self.post.id, self.from_user.id, self.to_user.id, unicode(self.time))
 
 
-class ProfileManager(models.Manager):
-    use_for_related_fields = True
-    def get_query_set(self):
-        qs = super(ProfileManager, self).get_query_set()
-        if forum_settings.REPUTATION_SUPPORT:
-            qs = qs.extra(select={
-                'reply_total': 'SELECT SUM(sign) FROM djangobb_forum_reputation WHERE to_user_id = djangobb_forum_profile.user_id GROUP BY to_user_id',
-                'reply_count_minus': "SELECT SUM(sign) FROM djangobb_forum_reputation WHERE to_user_id = djangobb_forum_profile.user_id AND sign = '-1' GROUP BY to_user_id",
-                'reply_count_plus': "SELECT SUM(sign) FROM djangobb_forum_reputation WHERE to_user_id = djangobb_forum_profile.user_id AND sign = '1' GROUP BY to_user_id",
-                })
-        return qs
-
 class Profile(models.Model):
     user = AutoOneToOneField(User, related_name='forum_profile', verbose_name=_('User'))
     status = models.CharField(_('Status'), max_length=30, blank=True)
@@ -306,16 +271,21 @@ class Profile(models.Model):
     signature_html = models.TextField(_('Signature'), blank=True, default='', max_length=forum_settings.SIGNATURE_MAX_LENGTH)
     time_zone = models.FloatField(_('Time zone'), choices=TZ_CHOICES, default=float(forum_settings.DEFAULT_TIME_ZONE))
     language = models.CharField(_('Language'), max_length=5, default='', choices=settings.LANGUAGES)
-    avatar = ExtendedImageField(_('Avatar'), blank=True, default='', upload_to=forum_settings.AVATARS_UPLOAD_TO, width=forum_settings.AVATAR_WIDTH, height=forum_settings.AVATAR_HEIGHT)
+    avatar = ExtendedImageField(_('Avatar'), blank=True, default='', upload_to=forum_settings.AVATARS_UPLOAD_TO)
+    # see djangobb_forum.avatars
+    avatar_state = models.IntegerField(_('Avatar state'), blank=True, default=0)
     theme = models.CharField(_('Theme'), choices=THEME_CHOICES, max_length=80, default='default')
     show_avatar = models.BooleanField(_('Show avatar'), blank=True, default=True)
     show_signatures = models.BooleanField(_('Show signatures'), blank=True, default=True)
     show_smilies = models.BooleanField(_('Show smilies'), blank=True, default=True)
     privacy_permission = models.IntegerField(_('Privacy permission'), choices=PRIVACY_CHOICES, default=1)
+    subscription_digest = models.CharField(_('Subscription e-mails'), max_length=10, choices=DIGEST_CHOICES, default='immediate')
+    last_digest = models.DateTimeField(_('Last digest'), blank=True, null=True)
     markup = models.CharField(_('Default markup'), max_length=15, default=forum_settings.DEFAULT_MARKUP, choices=MARKUP_CHOICES)
     post_count = models.IntegerField(_('Post count'), blank=True, default=0)
-
-    objects = ProfileManager()
+    reply_total = models.IntegerField(_('Reputation'), blank=True, default=0)
+    reply_count_plus = models.IntegerField(_('Positive reputation'), blank=True, default=0)
+    reply_count_minus = models.IntegerField(_('Negative reputation'), blank=True, default=0)
 
     class Meta:
         verbose_name = _('Profile')
@@ -346,6 +316,25 @@ class PostTracking(models.Model):
         return self.user.username
 
 
+class TopicTracking(models.Model):
+    """
+    Model for tracking read/unread posts, one row per user and read topic.
+    Used instead of PostTracking.topics by the 'table' tracking backend.
+    """
+
+    user = models.ForeignKey(User, verbose_name=_('User'))
+    topic = models.ForeignKey(Topic, verbose_name=_('Topic'))
+    last_read_post = models.IntegerField(_('Last read post'))
+
+    class Meta:
+        unique_together = (('user', 'topic'),)
+        verbose_name = _('Topic tracking')
+        verbose_name_plural = _('Topic tracking')
+
+    def __unicode__(self):
+        return u'%s: %d' % (self.user.username, self.topic_id)
+
+
 class Report(models.Model):
     reported_by = models.ForeignKey(User, related_name='reported_by', verbose_name=_('Reported by'))
     post = models.ForeignKey(Post, verbose_name=_('Post'))
@@ -388,27 +377,70 @@ class Attachment(models.Model):
         return self.name
 
     def save(self, *args, **kwargs):
-        super(Attachment, self).save(*args, **kwargs)
         if not self.hash:
-            self.hash = sha1(str(self.id) + settings.SECRET_KEY).hexdigest()
+            # key of the download URL, files are shared by identical uploads
+            self.hash = sha1(os.urandom(20) + settings.SECRET_KEY).hexdigest()
         super(Attachment, self).save(*args, **kwargs)
 
     @models.permalink
     def get_absolute_url(self):
         return ('djangobb:forum_attachment', [self.hash])
 
+    @models.permalink
+    def get_thumbnail_url(self):
+        return ('djangobb:forum_attachment_thumbnail',
+                [self.hash, forum_settings.ATTACHMENT_THUMBNAIL_SIZES[0]])
+
     def get_absolute_path(self):
         return os.path.join(settings.MEDIA_ROOT, forum_settings.ATTACHMENT_UPLOAD_TO,
                             self.path)
 
 
-from .signals import post_saved, topic_saved
+class Notification(models.Model):
+    """
+    Post whose topic subscribers are still to be notified,
+    queued when DJANGOBB_NOTIFICATION_QUEUE is on.
+    """
+
+    post = models.ForeignKey(Post, verbose_name=_('Post'))
+    created = models.DateTimeField(_('Created'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Notification')
+        verbose_name_plural = _('Notifications')
+
+    def __unicode__(self):
+        return u'%d' % self.post_id
+
+
+from djangobb_forum import counters
+from djangobb_forum import tracking as read_tracking
+from djangobb_forum import access
+from .signals import post_saved, topic_saved, ban_changed, access_changed,\
+    category_groups_changed, user_groups_changed, forum_moderators_changed,\
+    reputation_pre_save, reputation_saved, reputation_deleted
 
 post_save.connect(post_saved, sender=Post, dispatch_uid='djangobb_post_save')
 post_save.connect(topic_saved, sender=Topic, dispatch_uid='djangobb_topic_save')
+pre_save.connect(reputation_pre_save, sender=Reputation, dispatch_uid='djangobb_reputation_pre_save')
+post_save.connect(reputation_saved, sender=Reputation, dispatch_uid='djangobb_reputation_save')
+post_delete.connect(reputation_deleted, sender=Reputation, dispatch_uid='djangobb_reputation_delete')
+post_save.connect(ban_changed, sender=Ban, dispatch_uid='djangobb_ban_save')
+post_delete.connect(ban_changed, sender=Ban, dispatch_uid='djangobb_ban_delete')
+for sender in (Category, Forum):
+    post_save.connect(access_changed, sender=sender, dispatch_uid='djangobb_%s_access_save' % sender.__name__)
+    post_delete.connect(access_changed, sender=sender, dispatch_uid='djangobb_%s_access_delete' % sender.__name__)
+post_delete.connect(access_changed, sender=Group, dispatch_uid='djangobb_group_access_delete')
+m2m_changed.connect(category_groups_changed, sender=Category.groups.through,
+                    dispatch_uid='djangobb_category_groups_changed')
+m2m_changed.connect(user_groups_changed, sender=User.groups.through,
+                    dispatch_uid='djangobb_user_groups_changed')
+m2m_changed.connect(forum_moderators_changed, sender=Forum.moderators.through,
+                    dispatch_uid='djangobb_forum_moderators_changed')
 
 
 def is_user_banned(user):
-    return Ban.objects.filter(user=user).exists()
+    from djangobb_forum.bans import is_banned
+    return is_banned(user)
 
 
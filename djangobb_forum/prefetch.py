@@ -0,0 +1,104 @@
+"""
+Loading of a topic page with everything its template needs.
+
+Authors, editors, profiles, attachments and online status of a page of
+posts are fetched in a fixed number of queries, whatever the page size.
+Other lists of posts get at least their stale HTML rendered in one go.
+"""
+from djangobb_forum.models import Profile, Attachment
+from djangobb_forum import presence, rerender, gravatars
+from djangobb_forum import settings as forum_settings
+
+
+def load_posts(topic, posts):
+    """
+    Fetch list of posts of the topic with related data attached:
+    ``post.user.forum_profile`` (reputation totals are its columns),
+    ``post.attachment_list``, ``post.user.forum_online`` and
+    ``post.user.forum_gravatar``. Stale HTML
+    is rendered again in lazy rendering mode.
+    """
+    posts = list(posts)
+    if not posts:
+        return posts
+    users = dict((post.user_id, post.user) for post in posts)
+
+    profiles = dict((profile.user_id, profile) for profile in
+                    Profile.objects.filter(user__id__in=users.keys()))
+    for user_id, user in users.iteritems():
+        if user_id not in profiles:
+            # created on first access by AutoOneToOneField anyway
+            profiles[user_id] = Profile.objects.create(user=user)
+        user._forum_profile_cache = profiles[user_id]
+
+    online = presence.users.online_among(users.keys())
+    for user_id, user in users.iteritems():
+        user.forum_online = user_id in online
+    gravatars.load_users(users.values())
+
+    attachments = {}
+    for attachment in Attachment.objects.filter(post__id__in=[post.id for post in posts]):
+        attachments.setdefault(attachment.post_id, []).append(attachment)
+
+    for post in posts:
+        # several posts of one author share the same instance
+        post._user_cache = users[post.user_id]
+        post._topic_cache = topic
+        post.attachment_list = attachments.get(post.id, [])
+
+    if forum_settings.LAZY_RENDERING:
+        rerender.refresh_posts(posts)
+    return posts
+
+
+class PostPage(object):
+    """
+    Lazy sequence of posts of a topic for paginated views,
+    each fetched page is loaded with ``load_posts``. Posts should be
+    selected with their ``user`` and ``updated_by``.
+    """
+
+    def __init__(self, topic, posts):
+        self.topic = topic
+        self.posts = posts
+
+    def count(self):
+        return self.posts.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return load_posts(self.topic, self.posts[key])
+        return load_posts(self.topic, self.posts[key:key + 1])[0]
+
+    def __iter__(self):
+        return iter(load_posts(self.topic, self.posts))
+
+
+class SearchPage(object):
+    """
+    Lazy sequence of search results of posts for paginated views, posts
+    of each fetched page are loaded in bulk with fresh HTML.
+    """
+
+    def __init__(self, results):
+        self.results = results.load_all()
+
+    def count(self):
+        return len(self.results)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            results = list(self.results[key])
+            rerender.load_html([result.object for result in results
+                                if result.object is not None])
+            return results
+        return self[key:key + 1][0]
+
+    def __iter__(self):
+        return iter(self[:])
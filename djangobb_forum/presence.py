@@ -0,0 +1,80 @@
+"""
+Tracking of online users and guests in time-bucketed cache keys.
+
+Every bucket covers USER_ONLINE_BUCKET seconds. A member is recorded once
+per bucket with an atomic ``cache.add`` of its own key, and the first
+record also takes the next slot from the bucket counter, so concurrent
+requests never overwrite each other. The online list is read back from
+the slots of the buckets of the last USER_ONLINE_TIMEOUT seconds.
+"""
+import time
+from hashlib import md5
+
+from django.core.cache import cache
+
+from djangobb_forum import settings as forum_settings
+
+
+class Presence(object):
+
+    def __init__(self, name, timeout, bucket_size):
+        self.name = name
+        self.timeout = timeout
+        self.bucket_size = bucket_size
+        self.buckets = -(-timeout // bucket_size)
+
+    def _key(self, bucket):
+        return 'djangobb_%s_online_%d' % (self.name, bucket)
+
+    def _member_key(self, bucket, member):
+        # guest members are cookie values, keep the keys memcached safe
+        return '%s_%s' % (self._key(bucket), md5(str(member)).hexdigest())
+
+    def _slot_key(self, bucket, slot):
+        return '%s_slot_%d' % (self._key(bucket), slot)
+
+    def _current_buckets(self):
+        now = int(time.time()) // self.bucket_size
+        return range(now - self.buckets + 1, now + 1)
+
+    def touch(self, member):
+        """
+        Mark member as online.
+        """
+        bucket = int(time.time()) // self.bucket_size
+        timeout = self.timeout + self.bucket_size
+        if not cache.add(self._member_key(bucket, member), True, timeout):
+            return
+        cache.add(self._key(bucket), 0, timeout)
+        try:
+            slot = cache.incr(self._key(bucket))
+        except ValueError:
+            # counter was evicted, member is still found by is_online
+            return
+        cache.set(self._slot_key(bucket, slot), member, timeout)
+
+    def is_online(self, member):
+        keys = [self._member_key(bucket, member) for bucket in self._current_buckets()]
+        return bool(cache.get_many(keys))
+
+    def online_among(self, members):
+        """
+        Return set of online members among given ones with one cache lookup.
+        """
+        keys = dict((self._member_key(bucket, member), member) for member in members
+                    for bucket in self._current_buckets())
+        return set(keys[key] for key in cache.get_many(keys.keys()))
+
+    def members(self):
+        buckets = self._current_buckets()
+        counts = cache.get_many([self._key(bucket) for bucket in buckets])
+        keys = [self._slot_key(bucket, slot) for bucket in buckets
+                for slot in xrange(1, counts.get(self._key(bucket), 0) + 1)]
+        return set(cache.get_many(keys).itervalues())
+
+    def count(self):
+        return len(self.members())
+
+
+users = Presence('users', forum_settings.USER_ONLINE_TIMEOUT, forum_settings.USER_ONLINE_BUCKET)
+guests = Presence('guests', forum_settings.USER_ONLINE_TIMEOUT, forum_settings.USER_ONLINE_BUCKET)
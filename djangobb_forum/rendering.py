@@ -0,0 +1,114 @@
+"""
+Memoized rendering of post bodies and signatures to HTML.
+
+Results are keyed by (markup, smilies flag, renderer fingerprint, sha1
+of the text) and kept in a bounded in-process LRU. When
+DJANGOBB_RENDER_CACHE names one of CACHES, it is used as a shared
+second tier, so processes do not render the same text again.
+"""
+from hashlib import sha1
+import threading
+
+import postmarkup
+
+from djangobb_forum.util import convert_text_to_html, LRUCache
+from djangobb_forum import settings as forum_settings
+
+# bump when the output of the renderers changes
+RENDERER_VERSION = 2
+
+
+def _fingerprint():
+    """
+    Return short hash of the renderer version, smiles and versions of the
+    markup libraries, so changing any of them does not reuse cached HTML.
+    """
+    try:
+        import markdown
+        markdown_version = getattr(markdown, 'version', None)
+    except ImportError:
+        markdown_version = None
+    state = (RENDERER_VERSION, forum_settings.SMILES,
+             getattr(postmarkup, '__version__', None), markdown_version)
+    return sha1(repr(state)).hexdigest()[:8]
+
+FINGERPRINT = _fingerprint()
+
+
+def _shared_cache():
+    if not forum_settings.RENDER_CACHE:
+        return None
+    from django.core.cache import get_cache
+    return get_cache(forum_settings.RENDER_CACHE)
+
+
+class RenderCache(object):
+
+    def __init__(self, size, shared=None, timeout=None):
+        self.size = size
+        self.shared = shared
+        self.timeout = timeout
+        self.items = LRUCache(size)
+        # guards the counters
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def key(self, text, markup, smilies):
+        return 'djangobb_html_%s_%d_%s_%s' % (markup, smilies, FINGERPRINT,
+                                              sha1(text.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        html = self.items.get(key)
+        if html is not None:
+            with self.lock:
+                self.hits += 1
+            return html
+        if self.shared is not None:
+            html = self.shared.get(key)
+            if html is not None:
+                with self.lock:
+                    self.shared_hits += 1
+                self.items.set(key, html)
+                return html
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, html):
+        self.items.set(key, html)
+        if self.shared is not None:
+            self.shared.set(key, html, self.timeout)
+
+    def info(self):
+        return {'hits': self.hits, 'shared_hits': self.shared_hits,
+                'misses': self.misses, 'size': len(self.items)}
+
+    def clear(self):
+        self.items.clear()
+        with self.lock:
+            self.hits = self.shared_hits = self.misses = 0
+
+
+cache = RenderCache(forum_settings.RENDER_CACHE_SIZE, _shared_cache(),
+                    forum_settings.RENDER_CACHE_TIMEOUT)
+
+
+def render_html(text, markup, smilies=False):
+    """
+    Return HTML of the text in given markup, with smilies if requested.
+    """
+    key = cache.key(text, markup, smilies)
+    html = cache.get(key)
+    if html is None:
+        html = convert_text_to_html(text, markup, smilies)
+        cache.set(key, html)
+    return html
+
+
+def cache_info():
+    """
+    Return dict with counters of the render cache.
+    """
+    return cache.info()
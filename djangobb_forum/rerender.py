@@ -0,0 +1,228 @@
+"""
+Rendering of the stored HTML of posts and signatures again.
+
+``rerender`` reads rows in chunks ordered by id and renders them in a
+pool of worker processes. Changed HTML is written back by the main
+process with one UPDATE per chunk, bypassing ``save()`` and its signals.
+The last written id is kept in a checkpoint file, so an interrupted run
+can be resumed.
+
+In lazy rendering mode posts stamped with another renderer fingerprint
+are rendered when read instead, and the HTML is written back in batches
+by ``post_html``.
+"""
+import atexit
+import multiprocessing
+import os
+import time
+
+from django.db import connection, transaction
+
+from djangobb_forum.models import Post, Profile
+from djangobb_forum.util import convert_text_to_html, PeriodicBuffer
+from djangobb_forum.rendering import render_html, FINGERPRINT
+from djangobb_forum import settings as forum_settings
+
+# rows per UPDATE statement, SQLite allows 999 parameters
+UPDATE_BATCH = 300
+
+
+def _post_rows(after_id, count):
+    rows = Post.objects.filter(id__gt=after_id).order_by('id').values_list(
+        'id', 'body', 'markup', 'user__forum_profile__show_smilies', 'body_html',
+        'render_version')[:count]
+    # profiles are created with show_smilies on
+    return [(post_id, body, markup, forum_settings.SMILES_SUPPORT and smilies is not False,
+             html, version) for post_id, body, markup, smilies, html, version in rows]
+
+
+def _signature_rows(after_id, count):
+    rows = Profile.objects.filter(id__gt=after_id).order_by('id').values_list(
+        'id', 'signature', 'markup', 'signature_html')[:count]
+    return [(profile_id, signature, markup, False, html, FINGERPRINT)
+            for profile_id, signature, markup, html in rows]
+
+
+# name, model, html field, field of renderer fingerprint, reader of chunks
+TARGETS = (
+    ('posts', Post, 'body_html', 'render_version', _post_rows),
+    ('signatures', Profile, 'signature_html', None, _signature_rows),
+)
+
+
+def render_rows(rows):
+    """
+    Return list of (id, html) of rows whose stored HTML is stale.
+    Runs in the worker processes.
+    """
+    changed = []
+    for row_id, text, markup, smilies, html, version in rows:
+        new_html = convert_text_to_html(text, markup, smilies)
+        if new_html != html or version != FINGERPRINT:
+            changed.append((row_id, new_html))
+    return changed
+
+
+def update_rows(model, field, values, version_field=None, only_stale=False):
+    """
+    Set the field of rows given as (id, value) pairs with UPDATE ... CASE,
+    no signals are sent. ``version_field`` is set to the current renderer
+    fingerprint, with ``only_stale`` rows already stamped with it (saved
+    meanwhile) are left alone.
+    """
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    column = qn(model._meta.get_field(field).column)
+    pk = qn(model._meta.pk.column)
+    cursor = connection.cursor()
+    for start in xrange(0, len(values), UPDATE_BATCH):
+        batch = values[start:start + UPDATE_BATCH]
+        sql = 'UPDATE %s SET %s = CASE %s %s END' % (
+            table, column, pk, ' '.join(['WHEN %s THEN %s'] * len(batch)))
+        params = [param for pair in batch for param in pair]
+        if version_field:
+            sql += ', %s = %%s' % qn(model._meta.get_field(version_field).column)
+            params.append(FINGERPRINT)
+        sql += ' WHERE %s IN (%s)' % (pk, ', '.join(['%s'] * len(batch)))
+        params.extend(row_id for row_id, value in batch)
+        if version_field and only_stale:
+            sql += ' AND %s <> %%s' % qn(model._meta.get_field(version_field).column)
+            params.append(FINGERPRINT)
+        cursor.execute(sql, params)
+    transaction.commit_unless_managed()
+
+
+class Checkpoint(object):
+    """
+    Last written id of every target, kept in a file as ``name id`` lines.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.ids = {}
+        if path and os.path.exists(path):
+            for line in open(path):
+                name, last_id = line.split()
+                self.ids[name] = int(last_id)
+
+    def get(self, name):
+        return self.ids.get(name, 0)
+
+    def set(self, name, last_id):
+        self.ids[name] = last_id
+        if self.path:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as tmp:
+                tmp.writelines('%s %d\n' % item for item in sorted(self.ids.items()))
+            os.rename(tmp_path, self.path)
+
+    def clear(self):
+        self.ids = {}
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def rerender(names=None, chunk_size=500, processes=None, checkpoint=None, report=None):
+    """
+    Render again HTML of the targets (all by default), resuming after the
+    ids stored in the checkpoint. ``report`` is called with
+    (name, rows done, rows changed, seconds) after every round of chunks.
+    Returns dict of name -> (rows done, rows changed).
+    """
+    if checkpoint is None:
+        checkpoint = Checkpoint()
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    pool = None
+    if processes > 1:
+        # forked workers must not share the connection of the parent
+        connection.close()
+        pool = multiprocessing.Pool(processes)
+    results = {}
+    try:
+        for name, model, field, version_field, read in TARGETS:
+            if names and name not in names:
+                continue
+            start = time.time()
+            done = changed = 0
+            last_id = checkpoint.get(name)
+            while True:
+                chunks = []
+                for i in xrange(max(processes, 1)):
+                    rows = read(last_id, chunk_size)
+                    if not rows:
+                        break
+                    chunks.append(rows)
+                    last_id = rows[-1][0]
+                if not chunks:
+                    break
+                if pool is not None:
+                    rendered = pool.map(render_rows, chunks)
+                else:
+                    rendered = map(render_rows, chunks)
+                for rows, values in zip(chunks, rendered):
+                    update_rows(model, field, values, version_field)
+                    checkpoint.set(name, rows[-1][0])
+                    done += len(rows)
+                    changed += len(values)
+                if report:
+                    report(name, done, changed, time.time() - start)
+            results[name] = (done, changed)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    checkpoint.clear()
+    return results
+
+
+def refresh_posts(posts):
+    """
+    Render HTML of the posts stamped with another renderer fingerprint,
+    it is written back later by ``post_html``. Smilies settings of
+    authors not loaded with their profiles are fetched in one query.
+    """
+    stale = [post for post in posts if post.render_version != FINGERPRINT]
+    if not stale:
+        return
+    missing = set(post.user_id for post in stale
+                  if not hasattr(getattr(post, '_user_cache', None), '_forum_profile_cache'))
+    smilies = {}
+    if missing:
+        smilies = dict(Profile.objects.filter(user__id__in=missing)
+                       .values_list('user', 'show_smilies'))
+    for post in stale:
+        if post.user_id in missing:
+            # profiles are created with show_smilies on
+            show_smilies = smilies.get(post.user_id, True)
+        else:
+            show_smilies = post.user.forum_profile.show_smilies
+        post.body_html = render_html(post.body, post.markup,
+                                     forum_settings.SMILES_SUPPORT and show_smilies)
+        post.render_version = FINGERPRINT
+        post_html.add(post.id, post.body_html)
+
+
+def load_html(posts):
+    """
+    Return list of the posts, with stale HTML rendered again in lazy
+    rendering mode. For lists of posts not loaded by ``prefetch``.
+    """
+    posts = list(posts)
+    if forum_settings.LAZY_RENDERING:
+        refresh_posts(posts)
+    return posts
+
+
+class HTMLBuffer(PeriodicBuffer):
+    """
+    HTML of posts rendered on read, written back at most once per
+    ``interval`` seconds with UPDATE ... CASE statements.
+    """
+
+    def write(self, pending):
+        update_rows(Post, 'body_html', pending.items(), 'render_version', only_stale=True)
+
+
+post_html = HTMLBuffer(forum_settings.RENDER_FLUSH_INTERVAL)
+atexit.register(post_html.flush)
@@ -16,6 +16,13 @@ USERS_PAGE_SIZE = get('DJANGOBB_USERS_PAGE_SIZE', 20)
 AVATARS_UPLOAD_TO = get('DJANGOBB_AVATARS_UPLOAD_TO', 'djangobb_forum/avatars')
 AVATAR_WIDTH = get('DJANGOBB_AVATAR_WIDTH', 60)
 AVATAR_HEIGHT = get('DJANGOBB_AVATAR_HEIGHT', 60)
+# square renditions of uploaded avatars, made in the upload request or, with
+# AVATAR_BACKGROUND, by djangobb_process_avatars; the placeholder is shown meanwhile
+AVATAR_SIZES = get('DJANGOBB_AVATAR_SIZES', (60, 120))
+AVATAR_FORMAT = get('DJANGOBB_AVATAR_FORMAT', 'JPEG')
+AVATAR_QUALITY = get('DJANGOBB_AVATAR_QUALITY', 85)
+AVATAR_BACKGROUND = get('DJANGOBB_AVATAR_BACKGROUND', False)
+AVATAR_PLACEHOLDER = get('DJANGOBB_AVATAR_PLACEHOLDER', '%sdjangobb_forum/img/avatar_placeholder.png' % settings.STATIC_URL)
 DEFAULT_TIME_ZONE = get('DJANGOBB_DEFAULT_TIME_ZONE', 3)
 SIGNATURE_MAX_LENGTH = get('DJANGOBB_SIGNATURE_MAX_LENGTH', 1024)
 SIGNATURE_MAX_LINES = get('DJANGOBB_SIGNATURE_MAX_LINES', 3)
@@ -24,12 +31,34 @@ TAGLINE = get('DJANGOBB_TAGLINE', 'Django based forum engine')
 DEFAULT_MARKUP = get('DJANGOBB_DEFAULT_MARKUP', 'bbcode')
 NOTICE = get('DJANGOBB_NOTICE', '')
 USER_ONLINE_TIMEOUT = get('DJANGOBB_USER_ONLINE_TIMEOUT', 15 * 60)
+USER_ONLINE_BUCKET = get('DJANGOBB_USER_ONLINE_BUCKET', 60)
 EMAIL_DEBUG = get('DJANGOBB_FORUM_EMAIL_DEBUG', False)
+# queue notifications of topic subscribers for djangobb_send_notifications
+# instead of sending them while posting
+NOTIFICATION_QUEUE = get('DJANGOBB_NOTIFICATION_QUEUE', False)
 POST_USER_SEARCH = get('DJANGOBB_POST_USER_SEARCH', 1)
+# storage of read topics: 'json' - PostTracking.topics, 'table' - TopicTracking rows
+POST_TRACKING_BACKEND = get('DJANGOBB_POST_TRACKING_BACKEND', 'json')
+# seconds between writes of buffered topic views, 0 - write on every view;
+# views buffered by a process killed before writing them are lost
+TOPIC_VIEWS_FLUSH_INTERVAL = get('DJANGOBB_TOPIC_VIEWS_FLUSH_INTERVAL', 60)
+# paginate topics and forums by seeking on ordering keys, page counts from counters
+KEYSET_PAGINATION = get('DJANGOBB_KEYSET_PAGINATION', True)
+# rendered HTML of bodies and signatures: entries kept in process,
+# alias of CACHES entry shared between processes (None - disabled) and its timeout
+RENDER_CACHE_SIZE = get('DJANGOBB_RENDER_CACHE_SIZE', 1000)
+RENDER_CACHE = get('DJANGOBB_RENDER_CACHE', None)
+RENDER_CACHE_TIMEOUT = get('DJANGOBB_RENDER_CACHE_TIMEOUT', 24 * 60 * 60)
+# render posts stamped with an old renderer fingerprint when they are read
+# instead of with djangobb_rerender, and seconds between writes of their HTML
+LAZY_RENDERING = get('DJANGOBB_LAZY_RENDERING', False)
+RENDER_FLUSH_INTERVAL = get('DJANGOBB_RENDER_FLUSH_INTERVAL', 60)
 
 # GRAVATAR Extension
 GRAVATAR_SUPPORT = get('DJANGOBB_GRAVATAR_SUPPORT', True)
 GRAVATAR_DEFAULT = get('DJANGOBB_GRAVATAR_DEFAULT', 'identicon')
+# number of gravatar URLs memoized by each process
+GRAVATAR_CACHE_SIZE = get('DJANGOBB_GRAVATAR_CACHE_SIZE', 1000)
 
 # LOFI Extension
 LOFI_SUPPORT = get('DJANGOBB_LOFI_SUPPORT', True)
@@ -61,6 +90,16 @@ REPUTATION_SUPPORT = get('DJANGOBB_REPUTATION_SUPPORT', True)
 ATTACHMENT_SUPPORT = get('DJANGOBB_ATTACHMENT_SUPPORT', True)
 ATTACHMENT_UPLOAD_TO = get('DJANGOBB_ATTACHMENT_UPLOAD_TO', 'djangobb_forum/attachments')
 ATTACHMENT_SIZE_LIMIT = get('DJANGOBB_ATTACHMENT_SIZE_LIMIT', 1024 * 1024)
+# previews of image attachments: allowed sizes, the first one is shown in posts,
+# and directory of the made thumbnails under MEDIA_ROOT
+ATTACHMENT_THUMBNAIL_SIZES = get('DJANGOBB_ATTACHMENT_THUMBNAIL_SIZES', (200,))
+ATTACHMENT_THUMBNAILS_TO = get('DJANGOBB_ATTACHMENT_THUMBNAILS_TO', 'djangobb_forum/thumbnails')
+# let the front-end server send attachments: 'X-Sendfile' (Apache, lighttpd) gets
+# the path of the file, 'X-Accel-Redirect' (nginx) gets its path relative to
+# SENDFILE_ROOT appended to SENDFILE_URL, an internal location serving that directory
+ATTACHMENT_SENDFILE_HEADER = get('DJANGOBB_ATTACHMENT_SENDFILE_HEADER', None)
+ATTACHMENT_SENDFILE_ROOT = get('DJANGOBB_ATTACHMENT_SENDFILE_ROOT', settings.MEDIA_ROOT)
+ATTACHMENT_SENDFILE_URL = get('DJANGOBB_ATTACHMENT_SENDFILE_URL', '/protected/')
 
 # SMILE Extension
 SMILES_SUPPORT = get('DJANGOBB_SMILES_SUPPORT', True)
@@ -92,4 +131,6 @@ SMILES = ((r'(:|=)\)', EMOTION_SMILE), #:), =)
 SMILES = get('DJANGOBB_SMILES', SMILES)
 
 BAN_EXEMPT_URLS = [re.compile(expr) for expr in get('DJANGOBB_BAN_EXEMPT_URLS', [])]
+# seconds to keep ban status of a user in the cache
+BAN_CACHE_TIMEOUT = get('DJANGOBB_BAN_CACHE_TIMEOUT', 60 * 60)
 
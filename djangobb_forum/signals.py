@@ -1,32 +1,78 @@
-from datetime import datetime
-
-from django.db.models.signals import post_save
-
 from djangobb_forum.subscription import notify_topic_subscribers
-from djangobb_forum.models import Topic, Post
+from djangobb_forum import counters
+from djangobb_forum import bans
+from djangobb_forum import access
+from djangobb_forum.auth import invalidate_moderators
+from djangobb_forum.util import invalidate_keyset
 
 
 def post_saved(instance, **kwargs):
-    created = kwargs.get('created')
-    post = instance
-    topic = post.topic
-
-    if created:
-        topic.last_post = post
-        topic.post_count = topic.posts.count()
-        topic.updated = datetime.now()
-        profile = post.user.forum_profile
-        profile.post_count = post.user.posts.count()
-        profile.save(force_update=True)
-        notify_topic_subscribers(post)
-    topic.save(force_update=True)
+    if kwargs.get('created') and not kwargs.get('raw'):
+        counters.post_created(instance)
+        notify_topic_subscribers(instance)
 
 
 def topic_saved(instance, **kwargs):
-    topic = instance
-    forum = topic.forum
-    forum.topic_count = forum.topics.count()
-    forum.updated = topic.updated
-    forum.post_count = forum.posts.count()
-    forum.last_post_id = topic.last_post_id
-    forum.save(force_update=True)
+    if kwargs.get('created') and not kwargs.get('raw'):
+        counters.topic_created(instance)
+    elif not kwargs.get('raw'):
+        # may be stuck, unstuck or moved
+        invalidate_keyset('forum_%d' % instance.forum_id)
+
+
+def reputation_pre_save(instance, **kwargs):
+    if instance.pk and not kwargs.get('raw'):
+        # to_user may be changed in admin, totals of the old one are rebuilt too
+        instance._old_to_user_ids = list(instance.__class__.objects.filter(pk=instance.pk)
+                                         .values_list('to_user', flat=True))
+
+
+def reputation_saved(instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if kwargs.get('created'):
+        counters.reputation_created(instance)
+    else:
+        # sign may have been changed in admin
+        counters.rebuild_reputation(instance.to_user_id)
+        for user_id in getattr(instance, '_old_to_user_ids', []):
+            if user_id != instance.to_user_id:
+                counters.rebuild_reputation(user_id)
+
+
+def reputation_deleted(instance, **kwargs):
+    counters.reputation_deleted(instance)
+
+
+def ban_changed(instance, **kwargs):
+    bans.invalidate(instance.user_id)
+
+
+def access_changed(**kwargs):
+    access.invalidate()
+
+
+def category_groups_changed(action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        access.invalidate()
+
+
+def user_groups_changed(instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            access.invalidate_users([instance.id])
+    elif action in ('post_add', 'post_remove'):
+        access.invalidate_users(pk_set)
+    elif action == 'pre_clear':
+        # members are unknown after the clear
+        access.invalidate_users(instance.user_set.values_list('id', flat=True))
+
+
+def forum_moderators_changed(instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_moderators([instance.id])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_moderators(pk_set)
+    elif action == 'pre_clear':
+        invalidate_moderators(instance.moderators.values_list('id', flat=True))
@@ -1,13 +1,26 @@
-from django.core.mail import EmailMultiAlternatives
+from datetime import datetime, timedelta
+
+from django.core.mail import EmailMultiAlternatives, EmailMessage, get_connection
 from django.conf import settings
+from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from django.utils.html import strip_tags
+from django.db import connection, transaction
+from django.db.models import Count
 
+from djangobb_forum.models import Topic, Post, Profile, Notification
 from djangobb_forum import settings as forum_settings
 from djangobb_forum.util import absolute_url
 
 if "mailer" in settings.INSTALLED_APPS:
     from mailer import send_mail
+
+    def send_messages(messages, fail_silently=True):
+        """
+        Queue messages in django-mailer.
+        """
+        for msg in messages:
+            send_mail(msg.subject, msg.body, msg.from_email, msg.to)
 else:
     from django.core.mail import send_mail
     def send_mail(subject, text, from_email, rec_list, html=None):
@@ -18,14 +31,21 @@ else:
         msg = EmailMultiAlternatives(subject, text, from_email, rec_list)
         if html:
             msg.attach_alternative(html, "text/html")
+        send_messages([msg])
+
+    def send_messages(messages, fail_silently=True):
+        """
+        Send messages over one connection.
+        """
         if forum_settings.EMAIL_DEBUG:
-            print '---begin---'
-            print 'To:', rec_list
-            print 'Subject:', subject
-            print 'Body:', text
-            print '---end---'
-        else:
-            msg.send(fail_silently=True)
+            for msg in messages:
+                print '---begin---'
+                print 'To:', msg.to
+                print 'Subject:', msg.subject
+                print 'Body:', msg.body
+                print '---end---'
+        elif messages:
+            get_connection(fail_silently=fail_silently).send_messages(messages)
 
 
 # TODO: move to txt template
@@ -36,20 +56,202 @@ TOPIC_SUBSCRIPTION_TEXT_TEMPLATE = (u"""New reply from %(username)s to topic tha
 See topic: %(post_url)s
 Unsubscribe %(unsubscribe_url)s""")
 
+TOPIC_REPLY_TEXT_TEMPLATE = (u"""New reply from %(username)s:
+---
+%(message)s
+---
+See reply: %(post_url)s""")
+
+TOPIC_REPLIES_TEXT_TEMPLATE = (u"""New replies to topic that you have subscribed on.
+
+%(replies)s
+
+Unsubscribe %(unsubscribe_url)s""")
+
+TOPIC_DIGEST_TEXT_TEMPLATE = (u"""New replies to topics that you have subscribed on.
+
+%(topics)s""")
+
+TOPIC_DIGEST_ITEM_TEMPLATE = (u"""%(name)s: %(count)d new replies
+See topic: %(topic_url)s
+Unsubscribe %(unsubscribe_url)s""")
+
+# time covered by the first digest of a user
+DIGEST_PERIODS = {
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+}
+
+
+def _reply_context(post):
+    return {
+        'username': post.user.username,
+        'message': strip_tags(post.html),
+        'post_url': absolute_url(post.get_absolute_url()),
+        'unsubscribe_url': absolute_url(reverse('djangobb:forum_delete_subscription', args=[post.topic_id])),
+    }
+
+
+def topic_message(email, posts):
+    """
+    Return message about new replies to a topic.
+    """
+    topic = posts[0].topic
+    if len(posts) == 1:
+        text_content = TOPIC_SUBSCRIPTION_TEXT_TEMPLATE % _reply_context(posts[0])
+    else:
+        text_content = TOPIC_REPLIES_TEXT_TEMPLATE % {
+            'replies': u'\n\n'.join(TOPIC_REPLY_TEXT_TEMPLATE % _reply_context(post)
+                                    for post in posts),
+            'unsubscribe_url': absolute_url(reverse('djangobb:forum_delete_subscription', args=[topic.id])),
+        }
+    return EmailMessage(u'RE: %s' % topic.name, text_content, settings.DEFAULT_FROM_EMAIL, [email])
+
+
+def subscribers(topic_ids):
+    """
+    Return dict of topic id -> list of (user id, email) of its subscribers
+    who are notified immediately.
+    """
+    pairs = list(Topic.subscribers.through.objects.filter(topic__in=topic_ids)
+                 .values_list('topic', 'user'))
+    users = User.objects.filter(id__in=set(user_id for topic_id, user_id in pairs))\
+        .values_list('id', 'email', 'forum_profile__subscription_digest')
+    # users without profile get the default, immediate notifications
+    emails = dict((user_id, email) for user_id, email, digest in users
+                  if digest in (None, 'immediate'))
+    result = {}
+    for topic_id, user_id in pairs:
+        if emails.get(user_id):
+            result.setdefault(topic_id, []).append((user_id, emails[user_id]))
+    return result
+
+
+def send_notifications(posts, fail_silently=True):
+    """
+    Mail subscribers of the topics about the posts, replies to one topic
+    are sent to a user in one message. Returns number of messages.
+    """
+    posts = sorted(posts, key=lambda post: post.id)
+    if not posts:
+        return 0
+    by_topic = subscribers(set(post.topic_id for post in posts))
+    replies = {}
+    for post in posts:
+        for user_id, email in by_topic.get(post.topic_id, []):
+            if user_id != post.user_id:
+                replies.setdefault((user_id, post.topic_id), (email, []))[1].append(post)
+    messages = [topic_message(email, user_posts) for key, (email, user_posts)
+                in sorted(replies.iteritems())]
+    send_messages(messages, fail_silently)
+    return len(messages)
+
+
+def _claim(notifications):
+    """
+    Delete the notifications one by one and return those deleted by this
+    process, so overlapping runs never send the same ones.
+    """
+    qn = connection.ops.quote_name
+    sql = 'DELETE FROM %s WHERE %s = %%s' % (qn(Notification._meta.db_table),
+                                            qn(Notification._meta.pk.column))
+    cursor = connection.cursor()
+    claimed = []
+    for notification in notifications:
+        cursor.execute(sql, [notification.id])
+        if cursor.rowcount == 1:
+            claimed.append(notification)
+    transaction.commit_unless_managed()
+    return claimed
+
+
+def send_queued(batch_size=100):
+    """
+    Send notifications queued by ``notify_topic_subscribers`` in batches,
+    each over one connection. Every batch is taken off the queue before
+    sending and queued again if sending fails. Returns number of messages.
+    """
+    sent = 0
+    while True:
+        queued = list(Notification.objects.order_by('id')
+                      .select_related('post__topic', 'post__user')[:batch_size])
+        if not queued:
+            return sent
+        claimed = _claim(queued)
+        try:
+            sent += send_notifications([notification.post for notification in claimed],
+                                       fail_silently=False)
+        except Exception:
+            for notification in claimed:
+                Notification.objects.create(post=notification.post)
+            raise
+
+
+def digest_message(email, topics):
+    """
+    Return digest message about topics given as (id, name, new posts count).
+    """
+    items = [TOPIC_DIGEST_ITEM_TEMPLATE % {
+        'name': name,
+        'count': count,
+        'topic_url': absolute_url(reverse('djangobb:topic', args=[topic_id])),
+        'unsubscribe_url': absolute_url(reverse('djangobb:forum_delete_subscription', args=[topic_id])),
+    } for topic_id, name, count in topics]
+    text_content = TOPIC_DIGEST_TEXT_TEMPLATE % {'topics': u'\n\n'.join(items)}
+    return EmailMessage(u'New replies to %d subscribed topics' % len(topics), text_content,
+                        settings.DEFAULT_FROM_EMAIL, [email])
+
+
+def send_digests(period, batch_size=100, now=None):
+    """
+    Send a message to every user with the ``period`` digest setting about
+    subscribed topics with posts since the last digest. New posts of a
+    batch of users are counted with one aggregated query per distinct
+    time of the last digest, which is the same after the first run.
+    Returns number of messages.
+    """
+    if now is None:
+        now = datetime.now()
+    sent = 0
+    last_id = 0
+    while True:
+        profiles = list(Profile.objects.filter(subscription_digest=period, id__gt=last_id)
+                        .order_by('id').values_list('id', 'user', 'user__email', 'last_digest')[:batch_size])
+        if not profiles:
+            return sent
+        last_id = profiles[-1][0]
+        by_since = {}
+        for profile_id, user_id, email, last_digest in profiles:
+            if email:
+                since = last_digest or now - DIGEST_PERIODS[period]
+                by_since.setdefault(since, {})[user_id] = email
+        messages = []
+        for since, emails in sorted(by_since.iteritems()):
+            counts = {}
+            # replies only, like immediate notifications, without the subscriber's own
+            for user_id, topic_id, name, author_id, count in Post.objects\
+                    .filter(topic__subscribers__in=emails.keys(), created__gt=since, created__lte=now,
+                            position__gt=1)\
+                    .values_list('topic__subscribers', 'topic', 'topic__name', 'user')\
+                    .annotate(count=Count('id')).order_by():
+                if author_id != user_id:
+                    key = (user_id, topic_id, name)
+                    counts[key] = counts.get(key, 0) + count
+            topics = {}
+            for (user_id, topic_id, name), count in counts.iteritems():
+                topics.setdefault(user_id, []).append((topic_id, name, count))
+            messages.extend(digest_message(emails[user_id], sorted(user_topics))
+                            for user_id, user_topics in sorted(topics.iteritems()))
+        send_messages(messages)
+        Profile.objects.filter(id__in=[profile[0] for profile in profiles]).update(last_digest=now)
+        sent += len(messages)
+
 
 def notify_topic_subscribers(post):
-    topic = post.topic
-    post_body_text = strip_tags(post.body_html)
-    if post != topic.head:
-        for user in topic.subscribers.all():
-            if user != post.user:
-                subject = u'RE: %s' % topic.name
-                to_email = user.email
-                text_content = TOPIC_SUBSCRIPTION_TEXT_TEMPLATE % {
-                        'username': post.user.username,
-                        'message': post_body_text,
-                        'post_url': absolute_url(post.get_absolute_url()),
-                        'unsubscribe_url': absolute_url(reverse('djangobb:forum_delete_subscription', args=[post.topic.id])),
-                    }
-                #html_content = html_version(post)
-                send_mail(subject, text_content, settings.DEFAULT_FROM_EMAIL, [to_email])
+    #do not notify about the first post of a topic
+    if post.position == 1:
+        return
+    if forum_settings.NOTIFICATION_QUEUE:
+        Notification.objects.create(post=post)
+    else:
+        send_notifications([post])
@@ -1,14 +1,11 @@
 # -*- coding: utf-8
-import urllib
 
 from django import template
 from django.core.urlresolvers import reverse
-from django.core.cache import cache
 from django.utils.safestring import mark_safe
 from django.utils.encoding import smart_unicode
 from django.db import settings
 from django.utils.html import escape
-from django.utils.hashcompat import md5_constructor
 from django.contrib.humanize.templatetags.humanize import naturalday
 
 from pagination.templatetags.pagination_tags import paginate
@@ -16,6 +13,12 @@ from pagination.templatetags.pagination_tags import paginate
 from djangobb_forum.models import Report
 from djangobb_forum.auth import isa_forum_moderator
 from djangobb_forum import settings as forum_settings
+from djangobb_forum import counters
+from djangobb_forum import tracking
+from djangobb_forum import presence
+from djangobb_forum import avatars
+from djangobb_forum import thumbnails
+from djangobb_forum import gravatars
 
 
 register = template.Library()
@@ -128,34 +131,23 @@ def has_unreads(topic, user):
     """
     Check if topic has messages which user didn't read.
     """
-    if not user.is_authenticated() or\
-        (user.posttracking.last_read is not None and\
-         user.posttracking.last_read > topic.updated):
-            return False
-    else:
-        if isinstance(user.posttracking.topics, dict):
-            if topic.last_post_id > user.posttracking.topics.get(str(topic.id), 0):
-                return True
-            else:
-                return False
-        return True
+    return tracking.annotate_topics(user, [topic])[0].has_unreads
 
 @register.filter
 def forum_unreads(forum, user):
     """
     Check if forum has topic which user didn't read.
     """
-    if not user.is_authenticated():
-        return False
-    else:
-        read_topics = user.posttracking.topics or {}
-        topics = forum.topics.all().only('last_post')
-        if user.posttracking.last_read:
-            topics = topics.filter(updated__gte=user.posttracking.last_read)
-        for topic in topics:
-            if topic.last_post_id > read_topics.get(str(topic.id), 0):
-                return True
-        return False
+    return tracking.annotate_forums(user, [forum])[0].has_unreads
+
+
+@register.filter
+def topic_views(topic):
+    """
+    Return views count of topic including views not written yet by this
+    process.
+    """
+    return topic.views + counters.topic_views.get(topic.id)
 
 
 @register.filter
@@ -221,7 +213,10 @@ def forum_authority(user):
     
 @register.filter
 def online(user):
-    return cache.get('djangobb_user%d' % user.id)
+    if hasattr(user, 'forum_online'):
+        # set by prefetch.load_posts
+        return user.forum_online
+    return presence.users.is_online(user.id)
 
 @register.filter
 def attachment_link(attach):
@@ -236,7 +231,11 @@ def attachment_link(attach):
         img = '<img src="%sdjangobb_forum/img/attachment/doc.png" alt="attachment" />' % (settings.STATIC_URL)
     else:
         img = '<img src="%sdjangobb_forum/img/attachment/unknown.png" alt="attachment" />' % (settings.STATIC_URL)
-    attachment = '%s <a href="%s">%s</a> (%s)' % (img, attach.get_absolute_url(), attach.name, filesizeformat(attach.size))
+    attachment = '%s <a href="%s">%s</a> (%s)' % (img, attach.get_absolute_url(), escape(attach.name),
+                                                  filesizeformat(attach.size))
+    if attach.content_type in thumbnails.IMAGE_TYPES and forum_settings.ATTACHMENT_THUMBNAIL_SIZES:
+        attachment = '<a href="%s"><img src="%s" alt="%s" /></a><br />%s' % (
+            attach.get_absolute_url(), attach.get_thumbnail_url(), escape(attach.name), attachment)
     return mark_safe(attachment)
 
 
@@ -245,22 +244,28 @@ def new_reports():
     return Report.objects.filter(zapped=False).count()
 
 
+@register.simple_tag
+def avatar(profile, size=None):
+    """
+    Return <img> with the rendition of the avatar fitting given size.
+    """
+    return avatars.img(profile, size and int(size))
+
+
 @register.simple_tag(takes_context=True)
-def gravatar(context, email):
+def gravatar(context, user):
+    """
+    Return gravatar URL of the user or email.
+    """
     if forum_settings.GRAVATAR_SUPPORT:
         if 'request' in context:
             is_secure = context['request'].is_secure()
         else:
             is_secure = False
-        size = max(forum_settings.AVATAR_WIDTH, forum_settings.AVATAR_HEIGHT)
-        url = 'https://secure.gravatar.com/avatar/%s?' if is_secure \
-                else 'http://www.gravatar.com/avatar/%s?' 
-        url = url % md5_constructor(email.lower()).hexdigest()
-        url += urllib.urlencode({
-            'size': size,
-            'default': forum_settings.GRAVATAR_DEFAULT,
-        })
-        return url.replace('&', '&amp;')
+        urls = getattr(user, 'forum_gravatar', None)
+        if urls is not None:
+            return urls[is_secure]
+        return gravatars.cache.url(getattr(user, 'email', user), is_secure)
     else:
         return ''
 
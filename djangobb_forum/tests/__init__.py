@@ -2,4 +2,17 @@ from test_forum import *
 from test_reputation import *
 from test_profile import *
 from test_utils import *
-from test_templatetags import *
\ No newline at end of file
+from test_templatetags import *
+from test_counters import *
+from test_tracking import *
+from test_presence import *
+from test_bans import *
+from test_access import *
+from test_auth import *
+from test_prefetch import *
+from test_rerender import *
+from test_subscription import *
+from test_downloads import *
+from test_uploads import *
+from test_avatars import *
+from test_thumbnails import *
\ No newline at end of file
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth.models import User, Group, AnonymousUser
+
+from djangobb_forum.models import Category, Forum
+from djangobb_forum import access
+
+
+class TestAccess(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.get(pk=1)
+
+    def visible(self, user_id=None):
+        user = user_id and User.objects.get(pk=user_id) or AnonymousUser()
+        return access.visible_category_ids(user), sorted(access.visible_forum_ids(user))
+
+    def test_visible(self):
+        self.assertEqual(self.visible(), (set([1, 2]), [1, 2, 3]))
+        self.assertEqual(self.visible(3), (set([1, 2, 3]), [1, 2, 3, 4]))
+        self.assertTrue(Category.objects.get(pk=3).has_access(User.objects.get(pk=3)))
+        self.assertFalse(Category.objects.get(pk=3).has_access(User.objects.get(pk=2)))
+
+    def test_invalidation(self):
+        self.assertEqual(self.visible(2), (set([1, 2]), [1, 2, 3]))
+        User.objects.get(pk=2).groups.add(self.group)
+        self.assertEqual(self.visible(2), (set([1, 2, 3]), [1, 2, 3, 4]))
+        self.group.user_set.remove(User.objects.get(pk=2))
+        self.assertEqual(self.visible(2), (set([1, 2]), [1, 2, 3]))
+        Category.objects.get(pk=2).groups.add(self.group)
+        self.assertEqual(self.visible(2), (set([1]), [1, 2]))
+        forum = Forum.objects.create(category_id=1, name='New')
+        self.assertEqual(self.visible(2), (set([1]), [1, 2, forum.id]))
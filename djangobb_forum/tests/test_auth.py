@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth.models import User, AnonymousUser
+
+from djangobb_forum.models import Forum
+from djangobb_forum.auth import isa_forum_moderator, moderated_forum_ids
+
+
+class TestModerators(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        cache.clear()
+        self.forum = Forum.objects.get(pk=1)
+
+    def test_moderators(self):
+        self.assertFalse(isa_forum_moderator(self.forum, AnonymousUser()))
+        self.assertFalse(isa_forum_moderator(self.forum, User.objects.get(pk=2)))
+        self.assertTrue(isa_forum_moderator(self.forum, User.objects.get(pk=1)))
+        self.forum.moderators.add(User.objects.get(pk=2))
+        self.assertTrue(isa_forum_moderator(self.forum, User.objects.get(pk=2)))
+        self.assertFalse(isa_forum_moderator(Forum.objects.get(pk=2), User.objects.get(pk=2)))
+        User.objects.get(pk=2).forum_set.clear()
+        self.assertEqual(moderated_forum_ids(User.objects.get(pk=2)), frozenset())
+        self.forum.moderators.add(User.objects.get(pk=2))
+        self.forum.moderators.clear()
+        self.assertFalse(isa_forum_moderator(self.forum, User.objects.get(pk=2)))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+from django.test import TestCase
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import User
+
+from djangobb_forum.forms import UploadAvatarForm
+from djangobb_forum.models import Profile
+from djangobb_forum import avatars
+from djangobb_forum import settings as forum_settings
+
+
+class TestAvatars(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        self.profile = User.objects.get(pk=1).forum_profile
+        self.files = []
+
+    def tearDown(self):
+        forum_settings.AVATAR_BACKGROUND = False
+        storage = self.profile.avatar.storage
+        for name in self.files:
+            if storage.exists(name):
+                storage.delete(name)
+
+    def upload(self, name='avatar.PNG', format='PNG'):
+        try:
+            import Image
+        except ImportError:
+            from PIL import Image
+        content = StringIO()
+        Image.new('RGBA', (300, 200), (255, 0, 0, 128)).save(content, format=format)
+        data = SimpleUploadedFile(name, content.getvalue(), 'image/png')
+        form = UploadAvatarForm({}, {'avatar': data}, instance=self.profile)
+        self.assertTrue(form.is_valid())
+        profile = form.save()
+        self.files.append(profile.avatar.name)
+        self.files.extend(avatars.rendition_name(profile.avatar.name, size)
+                          for size in forum_settings.AVATAR_SIZES)
+        return profile
+
+    def test_renditions(self):
+        profile = self.upload()
+        self.assertTrue(profile.avatar.name.endswith('.png'))
+        self.assertEqual(Profile.objects.get(pk=profile.pk).avatar_state, avatars.READY)
+        storage = profile.avatar.storage
+        for size in forum_settings.AVATAR_SIZES:
+            name = avatars.rendition_name(profile.avatar.name, size)
+            self.assertTrue(name.endswith('_%d.jpg' % size))
+            self.assertTrue(storage.exists(name))
+        self.assertEqual(avatars.img(profile, 60),
+                         '<img src="%s" width="60" height="60" srcset="%s 2x" />'
+                         % (storage.url(avatars.rendition_name(profile.avatar.name, 60)),
+                            storage.url(avatars.rendition_name(profile.avatar.name, 120))))
+
+    def test_background(self):
+        forum_settings.AVATAR_BACKGROUND = True
+        profile = self.upload()
+        self.assertEqual(profile.avatar_state, avatars.PENDING)
+        self.assertTrue(forum_settings.AVATAR_PLACEHOLDER in avatars.img(profile))
+        self.assertEqual(avatars.process_pending(), 1)
+        self.assertEqual(Profile.objects.get(pk=profile.pk).avatar_state, avatars.READY)
+        self.assertEqual(avatars.process_pending(), 0)
+
+        # made again without showing the placeholder meanwhile
+        call_command('djangobb_process_avatars', all=True, stdout=StringIO())
+        self.assertEqual(Profile.objects.get(pk=profile.pk).avatar_state, avatars.READY)
+
+    def test_failure(self):
+        forum_settings.AVATAR_BACKGROUND = True
+        profile = self.upload()
+        _open = avatars._open
+        avatars._open = lambda fileobj: [][0]
+        avatars.logger.disabled = True
+        try:
+            self.assertEqual(avatars.process_pending(), 1)
+        finally:
+            avatars._open = _open
+            avatars.logger.disabled = False
+        profile = Profile.objects.get(pk=profile.pk)
+        self.assertEqual(profile.avatar_state, avatars.FAILED)
+        self.assertTrue(forum_settings.AVATAR_PLACEHOLDER in avatars.img(profile))
+        self.assertEqual(avatars.process_pending(), 0)
+
+    def test_extension(self):
+        forum_settings.AVATAR_BACKGROUND = True
+        # never taken from the uploaded name
+        self.assertTrue(self.upload('avatar.html').avatar.name.endswith('.png'))
+        self.assertTrue(self.upload('avatar.png', 'GIF').avatar.name.endswith('.gif'))
+        profile = self.upload('avatar.bmp.html', 'BMP')
+        self.assertTrue(profile.avatar.name.endswith('.png'))
+        self.assertEqual(profile.avatar.storage.open(profile.avatar.name).read(8), '\x89PNG\r\n\x1a\n')
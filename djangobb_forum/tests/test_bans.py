@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth.models import User
+
+from djangobb_forum.models import Ban
+from djangobb_forum.bans import get_ban, is_banned
+
+
+class TestBans(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.get(pk=3)
+
+    def get_ban(self):
+        # fresh instance, as for a new request
+        return get_ban(User.objects.get(pk=3))
+
+    def test_cached(self):
+        self.assertFalse(is_banned(self.user))
+        ban = Ban.objects.create(user=self.user, reason='test')
+        # memoized for the request
+        self.assertFalse(is_banned(self.user))
+        self.assertEqual(self.get_ban(), ban)
+        user = User.objects.get(pk=3)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_ban(user), ban)
+            self.assertEqual(get_ban(user), ban)
+            self.assertEqual(user.ban, ban)
+        ban.delete()
+        self.assertEqual(self.get_ban(), None)
+
+    def test_ban_end(self):
+        ban = Ban.objects.create(user=self.user, reason='test',
+                                 ban_end=datetime.now() + timedelta(days=1))
+        self.assertEqual(self.get_ban(), ban)
+        ban.ban_end = datetime.now() - timedelta(seconds=1)
+        ban.save()
+        self.assertEqual(self.get_ban(), None)
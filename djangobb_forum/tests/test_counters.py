@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from StringIO import StringIO
+
+from django.test import TestCase
+from django.core.management import call_command
+from django.contrib.auth.models import User
+
+from djangobb_forum.models import Forum, Topic, Post, Profile
+from djangobb_forum.counters import ViewsBuffer
+
+
+class TestCounters(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        self.forum = Forum.objects.get(pk=1)
+        self.topic = Topic.objects.get(pk=1)
+        self.user = User.objects.get(pk=1)
+        self.ip = '127.0.0.1'
+
+    def assertCounters(self, forum_posts, forum_topics, topic_posts, profile_posts):
+        forum = Forum.objects.get(pk=self.forum.id)
+        self.assertEqual(forum.post_count, forum_posts)
+        self.assertEqual(forum.topic_count, forum_topics)
+        if topic_posts is not None:
+            self.assertEqual(Topic.objects.get(pk=self.topic.id).post_count, topic_posts)
+        self.assertEqual(Profile.objects.get(user=self.user).post_count, profile_posts)
+
+    def test_create_post(self):
+        post = Post.objects.create(topic=self.topic, user=self.user, user_ip=self.ip,
+                                   markup='bbcode', body='Test Body')
+        self.assertCounters(7, 2, 5, 4)
+        self.assertEqual(Topic.objects.get(pk=self.topic.id).last_post_id, post.id)
+        self.assertEqual(Forum.objects.get(pk=self.forum.id).last_post_id, post.id)
+
+    def test_create_topic(self):
+        topic = Topic.objects.create(forum=self.forum, user=self.user, name='Test Title')
+        Post.objects.create(topic=topic, user=self.user, user_ip=self.ip,
+                            markup='bbcode', body='Test Body')
+        self.assertCounters(7, 3, 4, 4)
+        self.assertEqual(Topic.objects.get(pk=topic.id).post_count, 1)
+
+    def test_delete_post(self):
+        post = Post.objects.create(topic=self.topic, user=self.user, user_ip=self.ip,
+                                   markup='bbcode', body='Test Body')
+        Post.objects.get(pk=post.id).delete()
+        self.assertCounters(6, 2, 4, 3)
+        self.assertEqual(Topic.objects.get(pk=self.topic.id).last_post_id, 4)
+
+    def test_delete_topic(self):
+        Post.objects.get(pk=1).delete()
+        self.assertFalse(Topic.objects.filter(pk=self.topic.id).exists())
+        self.assertCounters(2, 1, None, 0)
+        self.assertEqual(Profile.objects.get(user__id=3).post_count, 2)
+        self.assertEqual(Forum.objects.get(pk=self.forum.id).last_post_id, 6)
+
+    def test_delete_numbered_topic(self):
+        call_command('djangobb_repair_positions', stdout=StringIO())
+        Post.objects.get(pk=2).delete()
+        self.assertTrue(Topic.objects.filter(pk=self.topic.id).exists())
+        Post.objects.get(pk=1).delete()
+        self.assertFalse(Topic.objects.filter(pk=self.topic.id).exists())
+
+    def test_create_post_queries_independent_of_forum_size(self):
+        Post.objects.create(topic=self.topic, user=self.user, user_ip=self.ip,
+                            markup='bbcode', body='warm up')
+
+        def create_post():
+            topic = Topic.objects.get(pk=self.topic.id)
+            user = User.objects.get(pk=self.user.id)
+            user.forum_profile
+            with self.assertNumQueries(7):
+                Post.objects.create(topic=topic, user=user, user_ip=self.ip,
+                                    markup='bbcode', body='Test Body')
+
+        create_post()
+        for i in xrange(20):
+            topic = Topic.objects.create(forum=self.forum, user=self.user, name='Topic %d' % i)
+            for j in xrange(5):
+                Post.objects.create(topic=topic, user=self.user, user_ip=self.ip,
+                                    markup='bbcode', body='Body %d' % j)
+        for i in xrange(20):
+            Post.objects.create(topic=self.topic, user=self.user, user_ip=self.ip,
+                                markup='bbcode', body='Reply %d' % i)
+        create_post()
+        self.assertCounters(129, 22, 27, 126)
+
+    def test_positions(self):
+        call_command('djangobb_repair_positions', stdout=StringIO())
+        posts = [Post.objects.create(topic=self.topic, user=self.user, user_ip=self.ip,
+                                     markup='bbcode', body='Test Body %d' % i) for i in xrange(3)]
+        self.assertEqual([post.position for post in posts], [5, 6, 7])
+        Post.objects.get(pk=posts[0].id).delete()
+        self.assertEqual(list(self.topic.posts.values_list('position', flat=True)), [1, 2, 3, 4, 5, 6])
+        Post.objects.filter(pk=posts[2].id).update(position=0)
+        output = StringIO()
+        call_command('djangobb_repair_positions', chunk_size=1, stdout=output)
+        self.assertIn('Corrected 1 posts', output.getvalue())
+        self.assertEqual(Post.objects.get(pk=posts[2].id).position, 6)
+
+    def test_positions_of_tied_topics(self):
+        # posts are grouped by topic id, not by the default ordering of topics
+        call_command('djangobb_repair_positions', stdout=StringIO())
+        for topic in (self.topic, Topic.objects.get(pk=2), self.topic):
+            Post.objects.create(topic=topic, user=self.user, user_ip=self.ip, markup='bbcode', body='Test Body')
+        Topic.objects.update(updated=self.topic.updated)
+        call_command('djangobb_repair_positions', stdout=StringIO())
+        for topic in Topic.objects.all():
+            self.assertEqual(list(topic.posts.order_by('created', 'id').values_list('position', flat=True)),
+                             range(1, topic.posts.count() + 1))
+
+    def test_rebuild_counters(self):
+        Topic.objects.filter(pk=1).update(post_count=100, last_post=None)
+        Forum.objects.filter(pk=1).update(post_count=0, topic_count=0)
+        Forum.objects.filter(pk=2).update(topic_count=5, last_post=1)
+        Profile.objects.filter(user__id=3).update(post_count=42)
+        output = StringIO()
+        call_command('djangobb_rebuild_counters', chunk_size=1, stdout=output)
+        self.assertIn('Corrected 1 topics, 2 forums, 1 profiles', output.getvalue())
+        self.assertCounters(6, 2, 4, 3)
+        self.assertEqual(Topic.objects.get(pk=1).last_post_id, 4)
+        forum = Forum.objects.get(pk=2)
+        self.assertEqual((forum.topic_count, forum.last_post_id), (0, None))
+        self.assertEqual(Profile.objects.get(user__id=3).post_count, 3)
+
+    def test_views_buffer(self):
+        buffer = ViewsBuffer(interval=3600)
+        for i in range(3):
+            buffer.add(self.topic.id, 1)
+        buffer.add(2, 1)
+        self.assertEqual(Topic.objects.get(pk=self.topic.id).views, 7)
+        self.assertEqual(buffer.get(self.topic.id), 3)
+        buffer.flush()
+        self.assertEqual(buffer.get(self.topic.id), 0)
+        self.assertEqual(Topic.objects.get(pk=self.topic.id).views, 10)
+        self.assertEqual(Topic.objects.get(pk=2).views, 3)
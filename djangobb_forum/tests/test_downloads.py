@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+
+from django.test import TestCase, RequestFactory
+
+from djangobb_forum.downloads import serve_file, parse_range
+from djangobb_forum import settings as forum_settings
+
+
+class TestDownloads(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.sendfile_root = forum_settings.ATTACHMENT_SENDFILE_ROOT
+        fd, self.path = tempfile.mkstemp()
+        self.data = ''.join(chr(i % 256) for i in xrange(200 * 1024))
+        os.write(fd, self.data)
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+        forum_settings.ATTACHMENT_SENDFILE_HEADER = None
+        forum_settings.ATTACHMENT_SENDFILE_ROOT = self.sendfile_root
+
+    def serve(self, **headers):
+        request = self.factory.get('/', **headers)
+        return serve_file(request, self.path, 'application/octet-stream', 'name.bin', 'abc')
+
+    def test_stream(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(self.data)))
+        self.assertEqual(response['ETag'], '"abc"')
+        self.assertEqual(''.join(response), self.data)
+
+    def test_range(self):
+        response = self.serve(HTTP_RANGE='bytes=100000-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 100000-204799/204800')
+        self.assertEqual(''.join(response), self.data[100000:])
+        self.assertEqual(''.join(self.serve(HTTP_RANGE='bytes=10-19')), self.data[10:20])
+        self.assertEqual(''.join(self.serve(HTTP_RANGE='bytes=-5')), self.data[-5:])
+        self.assertEqual(self.serve(HTTP_RANGE='bytes=300000-').status_code, 416)
+        # several ranges and outdated If-Range get the whole file
+        self.assertEqual(self.serve(HTTP_RANGE='bytes=1-2,5-6').status_code, 200)
+        self.assertEqual(self.serve(HTTP_RANGE='bytes=1-2', HTTP_IF_RANGE='"old"').status_code, 200)
+        self.assertEqual(parse_range('bytes=5-1', 10), False)
+
+    def test_not_modified(self):
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH='"abc"').status_code, 304)
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH='"old", "abc"').status_code, 304)
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH='"old"').status_code, 200)
+
+    def test_sendfile(self):
+        forum_settings.ATTACHMENT_SENDFILE_HEADER = 'X-Sendfile'
+        self.assertEqual(self.serve()['X-Sendfile'], self.path)
+        forum_settings.ATTACHMENT_SENDFILE_HEADER = 'X-Accel-Redirect'
+        forum_settings.ATTACHMENT_SENDFILE_ROOT = os.path.dirname(self.path)
+        self.assertEqual(self.serve()['X-Accel-Redirect'],
+                         '/protected/' + os.path.basename(self.path))
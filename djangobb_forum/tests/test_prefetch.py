@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth.models import User
+
+from djangobb_forum.models import Topic, Post, Attachment
+from djangobb_forum.prefetch import PostPage
+from djangobb_forum.templatetags.forum_extras import online, forum_authority
+from djangobb_forum import presence
+
+
+class TestPrefetch(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        cache.clear()
+        self.topic = Topic.objects.get(pk=1)
+        for i in xrange(5):
+            user = User.objects.create(username='author%d' % i)
+            post = Post.objects.create(topic=self.topic, user=user, body='body %d' % i)
+            Attachment(post=post, size=1, content_type='text/plain',
+                       path='path', name='name %d' % i).save()
+        presence.users.touch(user.id)
+
+    def render(self, posts):
+        for post in posts:
+            profile = post.user.forum_profile
+            (post.topic.name, post.updated_by, profile.status, profile.reply_total,
+             profile.signature_html, forum_authority(post.user), online(post.user),
+             list(post.attachment_list))
+
+    def test_queries(self):
+        topic = Topic.objects.get(pk=1)
+        page = PostPage(topic, topic.posts.select_related('user', 'updated_by'))
+        for size in (1, 4, 9):
+            self.assertNumQueries(3, lambda: self.render(page[0:size]))
+        posts = page[0:9]
+        self.assertEqual([len(post.attachment_list) for post in posts], [0] * 4 + [1] * 5)
+        self.assertEqual([online(post.user) for post in posts], [False] * 8 + [True])
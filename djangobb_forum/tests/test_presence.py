@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.test import TestCase
+from django.core.cache import cache
+
+from djangobb_forum.presence import Presence
+
+
+class TestPresence(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.presence = Presence('test', timeout=300, bucket_size=60)
+
+    def test_touch(self):
+        for member in (1, 2, 3, 2):
+            self.presence.touch(member)
+        self.assertEqual(self.presence.members(), set([1, 2, 3]))
+        self.assertEqual(self.presence.count(), 3)
+        self.assertTrue(self.presence.is_online(2))
+        self.assertFalse(self.presence.is_online(4))
+
+    def test_expiry(self):
+        now = time.time()
+        self.presence.touch(1)
+        old_time = time.time
+        time.time = lambda: now + 360
+        try:
+            self.presence.touch(2)
+            self.assertEqual(self.presence.members(), set([2]))
+            self.assertFalse(self.presence.is_online(1))
+        finally:
+            time.time = old_time
+
+    def test_online_among(self):
+        for member in (1, 2, 3):
+            self.presence.touch(member)
+        self.assertEqual(self.presence.online_among([2, 3, 4]), set([2, 3]))
+        self.assertEqual(self.presence.online_among([]), set())
+
+    def test_guest_sid(self):
+        sid = 'cookie value ' * 30
+        self.presence.touch(sid)
+        self.presence.touch('')
+        self.assertTrue(self.presence.is_online(sid))
+        self.assertEqual(self.presence.members(), set([sid, '']))
@@ -2,7 +2,8 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
 
-from djangobb_forum.models import Post, Reputation
+from djangobb_forum.models import Post, Profile, Reputation
+from djangobb_forum.counters import rebuild_profiles
 
 
 class TestReputation(TestCase):
@@ -34,4 +35,38 @@ class TestReputation(TestCase):
         total_reputation = 0
         for reputation in reputations:
             total_reputation += reputation.sign
-        self.assertEqual(total_reputation, -1)
\ No newline at end of file
+        self.assertEqual(total_reputation, -1)
+
+    def test_reputation_totals(self):
+        Reputation.objects.create(from_user=self.from_user, to_user=self.to_user,
+                                  post=self.post, sign=1, reason=self.reason)
+        minus = Reputation.objects.create(from_user=self.from_user, to_user=self.to_user,
+                                          post=Post.objects.get(pk=2), sign=-1, reason=self.reason)
+        Reputation.objects.create(from_user=self.from_user, to_user=self.to_user,
+                                  post=Post.objects.get(pk=3), sign=-1, reason=self.reason)
+        profile = Profile.objects.get(user=self.to_user)
+        self.assertEqual((profile.reply_total, profile.reply_count_plus, profile.reply_count_minus),
+                         (-1, 1, 2))
+        minus.delete()
+        profile = Profile.objects.get(user=self.to_user)
+        self.assertEqual((profile.reply_total, profile.reply_count_plus, profile.reply_count_minus),
+                         (0, 1, 1))
+
+        # moved to another user in admin
+        minus = Reputation.objects.get(post__id=3)
+        minus.to_user = self.from_user
+        minus.save()
+        profile = Profile.objects.get(user=self.to_user)
+        self.assertEqual((profile.reply_total, profile.reply_count_plus, profile.reply_count_minus),
+                         (1, 1, 0))
+        profile = Profile.objects.get(user=self.from_user)
+        self.assertEqual((profile.reply_total, profile.reply_count_plus, profile.reply_count_minus),
+                         (-1, 0, 1))
+        minus.to_user = self.to_user
+        minus.save()
+
+        Profile.objects.filter(user=self.to_user).update(reply_total=5, reply_count_minus=0)
+        self.assertEqual(rebuild_profiles(), 1)
+        profile = Profile.objects.get(user=self.to_user)
+        self.assertEqual((profile.reply_total, profile.reply_count_plus, profile.reply_count_minus),
+                         (0, 1, 1))
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+
+from django.test import TestCase
+from django.db.models.signals import post_save
+
+from djangobb_forum.models import Topic, Post
+from djangobb_forum.util import convert_text_to_html
+from djangobb_forum.prefetch import PostPage
+from djangobb_forum.rendering import FINGERPRINT
+from djangobb_forum import rerender
+from djangobb_forum import settings as forum_settings
+
+
+class TestRerender(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        Post.objects.update(body_html='stale')
+        self.saved = []
+        post_save.connect(self.on_save, dispatch_uid='test_rerender')
+
+    def tearDown(self):
+        post_save.disconnect(dispatch_uid='test_rerender')
+
+    def on_save(self, sender, **kwargs):
+        self.saved.append(sender)
+
+    def test_rerender(self):
+        fd, path = tempfile.mkstemp()
+        os.write(fd, 'posts 1\n')
+        os.close(fd)
+        count = Post.objects.count()
+        results = rerender.rerender(['posts'], chunk_size=2, processes=1,
+                                    checkpoint=rerender.Checkpoint(path))
+        self.assertEqual(results, {'posts': (count - 1, count - 1)})
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.saved, [])
+        for post in Post.objects.all():
+            if post.id == 1:
+                self.assertEqual(post.body_html, 'stale')
+            else:
+                self.assertEqual(post.body_html, convert_text_to_html(post.body, post.markup, True))
+        # nothing left to change
+        self.assertEqual(rerender.rerender(['posts'], processes=1), {'posts': (count, 1)})
+
+
+class TestLazyRendering(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        forum_settings.LAZY_RENDERING = True
+        self.interval = rerender.post_html.interval
+        rerender.post_html.interval = 24 * 60 * 60
+        Post.objects.update(body_html='stale', render_version='old')
+
+    def tearDown(self):
+        forum_settings.LAZY_RENDERING = False
+        rerender.post_html.interval = self.interval
+        rerender.post_html.pending.clear()
+
+    def test_page(self):
+        topic = Topic.objects.get(pk=1)
+        page = PostPage(topic, topic.posts.select_related('user', 'updated_by'))
+        with self.assertNumQueries(3):
+            htmls = [post.html for post in page[0:10]]
+        posts = list(topic.posts.all())
+        self.assertEqual(htmls, [convert_text_to_html(post.body, post.markup, True) for post in posts])
+
+        # saved meanwhile, the HTML of the page is older
+        posts[0].body = 'edited'
+        posts[0].save()
+        rerender.post_html.flush()
+        self.assertEqual(Post.objects.get(pk=posts[0].id).body_html, 'edited')
+        for post in Post.objects.filter(topic=topic):
+            self.assertEqual(post.render_version, FINGERPRINT)
+            self.assertNotEqual(post.body_html, 'stale')
+        # written back, nothing to render
+        self.assertEqual(Post.objects.get(pk=posts[-1].id).html, htmls[-1])
+        self.assertEqual(rerender.post_html.pending, {})
+
+    def test_list(self):
+        # posts of search results and feeds come without their authors
+        with self.assertNumQueries(2):
+            posts = rerender.load_html(Post.objects.all())
+            htmls = [post.html for post in posts]
+        self.assertEqual(htmls, [convert_text_to_html(post.body, post.markup, True) for post in posts])
+        response = self.client.get('/forum/feeds/topics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse('stale' in response.content)
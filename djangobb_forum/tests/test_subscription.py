@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+from StringIO import StringIO
+
+from django.test import TestCase
+from django.core import mail
+from django.core.management import call_command
+from django.contrib.auth.models import User
+
+from djangobb_forum.models import Topic, Post, Notification
+from djangobb_forum.subscription import send_digests, _claim
+from djangobb_forum import settings as forum_settings
+from djangobb_forum import subscription
+
+
+class TestSubscription(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        self.topic = Topic.objects.get(pk=1)
+        self.poster = User.objects.get(pk=1)
+        self.subscribe(3)
+
+    def tearDown(self):
+        forum_settings.NOTIFICATION_QUEUE = False
+
+    def subscribe(self, count):
+        for i in xrange(count):
+            user = User.objects.create(username='subscriber%d' % self.topic.subscribers.count(),
+                                       email='subscriber%d@example.com' % i)
+            self.topic.subscribers.add(user)
+        self.topic.subscribers.add(self.poster)
+
+    def reply(self, body='reply'):
+        topic = Topic.objects.get(pk=self.topic.id)
+        return Post.objects.create(topic=topic, user=self.poster, markup='bbcode', body=body)
+
+    def test_immediate(self):
+        self.reply()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].subject, u'RE: %s' % self.topic.name)
+
+    def test_queue(self):
+        forum_settings.NOTIFICATION_QUEUE = True
+        self.reply()
+        self.subscribe(10)
+        poster = User.objects.get(pk=self.poster.id)
+        poster.forum_profile
+        # posting does not depend on the number of subscribers
+        topic = Topic.objects.get(pk=self.topic.id)
+        with self.assertNumQueries(7):
+            Post.objects.create(topic=topic, user=poster, markup='bbcode', body='second')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Notification.objects.count(), 2)
+
+        call_command('djangobb_send_notifications', batch_size=10, stdout=StringIO())
+        # two replies to the topic in one message
+        self.assertEqual(len(mail.outbox), 13)
+        self.assertTrue('second' in mail.outbox[0].body)
+        self.assertEqual(Notification.objects.count(), 0)
+
+    def test_claim(self):
+        forum_settings.NOTIFICATION_QUEUE = True
+        self.reply()
+        self.reply()
+        queued = list(Notification.objects.all())
+        # a run overlapping with another one gets only what is left
+        self.assertEqual(_claim(queued[:1]), queued[:1])
+        self.assertEqual(_claim(queued), queued[1:])
+        self.assertEqual(_claim(queued), [])
+        self.assertEqual(Notification.objects.count(), 0)
+
+    def test_requeue(self):
+        forum_settings.NOTIFICATION_QUEUE = True
+        self.reply()
+
+        class BrokenConnection(object):
+            def __init__(self, fail_silently=False):
+                self.fail_silently = fail_silently
+
+            def send_messages(self, messages):
+                if not self.fail_silently:
+                    raise IOError('mail server is down')
+
+        get_connection = subscription.get_connection
+        subscription.get_connection = BrokenConnection
+        try:
+            self.assertRaises(IOError, subscription.send_queued)
+        finally:
+            subscription.get_connection = get_connection
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(subscription.send_queued(), 3)
+        self.assertEqual(Notification.objects.count(), 0)
+
+    def test_digest(self):
+        other = Topic.objects.get(pk=2)
+        for user in self.topic.subscribers.exclude(pk=self.poster.id)[:2]:
+            profile = user.forum_profile
+            profile.subscription_digest = 'hourly'
+            profile.save()
+            other.subscribers.add(user)
+        self.reply()
+        self.reply()
+        Post.objects.create(topic=other, user=self.poster, markup='bbcode', body='other')
+        # only the subscriber without digest
+        self.assertEqual(len(mail.outbox), 2)
+
+        mail.outbox = []
+        with self.assertNumQueries(4):
+            self.assertEqual(send_digests('hourly'), 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertTrue(u'%s: 2 new replies' % self.topic.name in mail.outbox[0].body)
+        self.assertTrue(u'%s: 1 new replies' % other.name in mail.outbox[0].body)
+        self.assertEqual(send_digests('hourly'), 0)
+        self.assertEqual(send_digests('daily'), 0)
+
+    def test_digest_replies_of_others(self):
+        subscriber = self.topic.subscribers.exclude(pk=self.poster.id)[0]
+        profile = subscriber.forum_profile
+        profile.subscription_digest = 'hourly'
+        profile.save()
+        Post.objects.create(topic=Topic.objects.get(pk=self.topic.id), user=subscriber,
+                            markup='bbcode', body='own reply')
+        topic = Topic.objects.create(forum=self.topic.forum, user=self.poster, name='New topic')
+        Post.objects.create(topic=topic, user=self.poster, markup='bbcode', body='head')
+        topic.subscribers.add(subscriber)
+        mail.outbox = []
+        # neither own replies nor first posts of topics
+        self.assertEqual(send_digests('hourly'), 0)
+        self.reply()
+        mail.outbox = []
+        self.assertEqual(send_digests('hourly'), 1)
+        self.assertTrue(u'%s: 1 new replies' % self.topic.name in mail.outbox[0].body)
@@ -3,7 +3,8 @@ from django.test import TestCase
 from django.contrib.auth.models import User
 
 from djangobb_forum.models import Post
-from djangobb_forum.templatetags.forum_extras import profile_link, link, lofi_link
+from djangobb_forum.templatetags.forum_extras import profile_link, link, lofi_link, gravatar
+from djangobb_forum import gravatars
 
 
 class TestLinkTags(TestCase):
@@ -24,3 +25,27 @@ class TestLinkTags(TestCase):
     def test_lofi_link(self):
         l = lofi_link(self.post)
         self.assertEqual(l, "<a href=\"/forum/post/1/lofi/\">Test Body</a>")
+
+
+class TestGravatar(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        self.user = User.objects.get(pk=1)
+        gravatars.cache.clear()
+
+    def test_gravatar(self):
+        url = gravatar({}, self.user.email)
+        self.assertEqual(url, 'http://www.gravatar.com/avatar/%s?default=identicon&amp;size=60'
+                         % gravatars.md5(self.user.email.lower()).hexdigest())
+        self.assertTrue(gravatar({}, self.user.email) is url)
+        gravatars.load_users([self.user])
+        self.assertEqual(gravatar({}, self.user), url)
+        self.assertTrue(self.user.forum_gravatar[1].startswith('https://secure.gravatar.com/'))
+
+    def test_email_change(self):
+        gravatars.load_users([self.user])
+        self.user.email = 'other@example.com'
+        gravatars.load_users([self.user])
+        self.assertEqual(self.user.forum_gravatar[0], gravatar({}, 'other@example.com'))
+        self.assertEqual(len(gravatars.cache.items), 4)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+
+from djangobb_forum.models import Post, Attachment
+from djangobb_forum import uploads, thumbnails
+from djangobb_forum import settings as forum_settings
+
+
+class TestThumbnails(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        self.upload_to = forum_settings.ATTACHMENT_UPLOAD_TO
+        self.thumbnails_to = forum_settings.ATTACHMENT_THUMBNAILS_TO
+        # absolute, so they replace MEDIA_ROOT
+        forum_settings.ATTACHMENT_UPLOAD_TO = tempfile.mkdtemp()
+        forum_settings.ATTACHMENT_THUMBNAILS_TO = tempfile.mkdtemp()
+        self.post = Post.objects.get(pk=1)
+        self.client.login(username='djangobb', password='djangobb')
+
+    def tearDown(self):
+        shutil.rmtree(forum_settings.ATTACHMENT_UPLOAD_TO)
+        shutil.rmtree(forum_settings.ATTACHMENT_THUMBNAILS_TO)
+        forum_settings.ATTACHMENT_UPLOAD_TO = self.upload_to
+        forum_settings.ATTACHMENT_THUMBNAILS_TO = self.thumbnails_to
+
+    def attach(self, data, content_type):
+        memfile = SimpleUploadedFile('picture', data, content_type)
+        return Attachment.objects.create(size=memfile.size, content_type=memfile.content_type,
+                                         name=memfile.name, post=self.post,
+                                         path=uploads.store(memfile))
+
+    def image(self, format):
+        try:
+            import Image
+        except ImportError:
+            from PIL import Image
+        content = StringIO()
+        Image.new('RGB', (800, 400), (255, 0, 0)).save(content, format=format)
+        return content.getvalue()
+
+    def test_thumbnail(self):
+        attachment = self.attach(self.image('GIF'), 'image/gif')
+        url = attachment.get_thumbnail_url()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response['Content-Disposition'].startswith('inline;'))
+        path = thumbnails.thumbnail_path(attachment, forum_settings.ATTACHMENT_THUMBNAIL_SIZES[0])
+        self.assertEqual(''.join(response), open(path, 'rb').read())
+        # kept on disk
+        os.utime(path, (0, 0))
+        self.client.get(url)
+        self.assertEqual(os.stat(path).st_mtime, 0)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # other sizes, other types and broken images are not found
+        self.assertEqual(self.client.get(url.replace('/200/', '/201/')).status_code, 404)
+        text = self.attach('text', 'text/plain')
+        self.assertEqual(self.client.get(text.get_thumbnail_url()).status_code, 404)
+        broken = self.attach('broken', 'image/jpeg')
+        self.assertEqual(self.client.get(broken.get_thumbnail_url()).status_code, 404)
+
+    def test_jpeg(self):
+        attachment = self.attach(self.image('JPEG'), 'image/jpeg')
+        path = thumbnails.get(attachment, 100)
+        self.assertTrue(path.endswith('_100.jpg'))
+        try:
+            import Image
+        except ImportError:
+            from PIL import Image
+        self.assertEqual(Image.open(path).size, (100, 50))
+        self.assertEqual(os.stat(path).st_mode & 0777, 0644)
+
+    def test_shared_file(self):
+        first = self.attach(self.image('PNG'), 'image/png')
+        second = self.attach(self.image('PNG'), 'image/png')
+        path = thumbnails.get(first, 100)
+        self.assertEqual(thumbnails.get(second, 100), path)
+
+        # a thumbnail made by another request is not waited for long
+        lock = 'djangobb_thumbnail_lock_%s' % os.path.basename(path).replace('100', '200')
+        cache.set(lock, 1)
+        thumbnails.WAIT_TIMEOUT, timeout = 0, thumbnails.WAIT_TIMEOUT
+        try:
+            self.assertEqual(thumbnails.get(first, 200), None)
+            response = self.client.get(first.get_thumbnail_url())
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response['Location'].endswith(first.get_absolute_url()))
+        finally:
+            thumbnails.WAIT_TIMEOUT = timeout
+        self.assertEqual(cache.get(lock), 1)
+        cache.delete(lock)
+
+        first.delete()
+        self.assertEqual(thumbnails.remove_orphans(0), (0, 0))
+        second.delete()
+        self.assertEqual(thumbnails.remove_orphans(), (0, 0))
+        self.assertEqual(thumbnails.remove_orphans(0)[0], 1)
+        self.assertFalse(os.path.exists(path))
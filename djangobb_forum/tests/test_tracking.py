@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from StringIO import StringIO
+
+from django.test import TestCase
+from django.core.management import call_command
+from django.contrib.auth.models import User, AnonymousUser
+
+from djangobb_forum.models import Forum, Topic, PostTracking, TopicTracking
+from djangobb_forum import tracking
+from djangobb_forum.tracking import JSONBackend, TableBackend
+
+
+class TestTrackingBackends(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        self.user = User.objects.get(pk=3)
+        PostTracking.objects.filter(user=self.user).update(topics='{"1": 3}')
+        self.topic = Topic.objects.get(pk=1)
+        self.topic2 = Topic.objects.get(pk=2)
+
+    def check_backend(self, backend):
+        backend.mark_read(self.user, self.topic)
+        self.assertEqual(backend.read_posts(self.user, [1, 2]), {1: 4})
+        backend.mark_read(self.user, self.topic2)
+        backend.mark_read(self.user, self.topic2)
+        self.assertEqual(backend.read_posts(self.user, [1, 2]), {1: 4, 2: 6})
+        backend.mark_all_read(self.user)
+        self.assertEqual(backend.read_posts(User.objects.get(pk=3), [1, 2]), {})
+
+    def test_json_backend(self):
+        self.check_backend(JSONBackend())
+
+    def test_table_backend(self):
+        self.check_backend(TableBackend())
+        self.assertFalse(TopicTracking.objects.exists())
+
+    def test_migrate_tracking(self):
+        TopicTracking.objects.create(user=self.user, topic=self.topic2, last_read_post=5)
+        PostTracking.objects.filter(user=self.user).update(topics='{"1": 3, "2": 6, "100": 7}')
+        call_command('djangobb_migrate_tracking', clear=True, stdout=StringIO())
+        self.assertEqual(TableBackend().read_posts(self.user, [1, 2, 100]), {1: 3, 2: 6})
+        self.assertEqual(PostTracking.objects.get(user=self.user).topics, None)
+
+
+class TestUnreads(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        self.user = User.objects.get(pk=3)
+        PostTracking.objects.filter(user=self.user).update(topics='{"1": 3, "2": 6}')
+        TopicTracking.objects.create(user=self.user, topic_id=1, last_read_post=3)
+        TopicTracking.objects.create(user=self.user, topic_id=2, last_read_post=6)
+        self.backend = tracking.backend
+
+    def tearDown(self):
+        tracking.backend = self.backend
+
+    def check_unreads(self):
+        forums = tracking.annotate_forums(self.user, list(Forum.objects.all()))
+        self.assertEqual([forum.id for forum in forums if forum.has_unreads], [1])
+        topics = tracking.annotate_topics(self.user, list(Topic.objects.all()))
+        self.assertEqual([topic.id for topic in topics if topic.has_unreads], [1])
+        with self.assertNumQueries(0):
+            topics = tracking.annotate_topics(AnonymousUser(), topics)
+        self.assertFalse(any(topic.has_unreads for topic in topics))
+
+    def test_json_backend(self):
+        tracking.backend = JSONBackend()
+        self.check_unreads()
+
+    def test_table_backend(self):
+        tracking.backend = TableBackend()
+        self.check_unreads()
+        forums = list(Forum.objects.all())
+        with self.assertNumQueries(1):
+            tracking.annotate_forums(self.user, forums)
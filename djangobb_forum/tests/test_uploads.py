@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from djangobb_forum.models import Post, Attachment
+from djangobb_forum import uploads
+from djangobb_forum import settings as forum_settings
+
+
+class TestUploads(TestCase):
+    fixtures = ['test_forum.json']
+
+    def setUp(self):
+        self.upload_to = forum_settings.ATTACHMENT_UPLOAD_TO
+        # absolute, so it replaces MEDIA_ROOT
+        forum_settings.ATTACHMENT_UPLOAD_TO = tempfile.mkdtemp()
+        self.post = Post.objects.get(pk=1)
+
+    def tearDown(self):
+        shutil.rmtree(forum_settings.ATTACHMENT_UPLOAD_TO)
+        forum_settings.ATTACHMENT_UPLOAD_TO = self.upload_to
+
+    def upload(self, data):
+        memfile = SimpleUploadedFile('name.txt', data, 'text/plain')
+        with self.assertNumQueries(1):
+            return Attachment.objects.create(size=memfile.size, content_type=memfile.content_type,
+                                             name=memfile.name, post=self.post,
+                                             path=uploads.store(memfile))
+
+    def test_dedup(self):
+        first = self.upload('x' * 100000)
+        second = self.upload('x' * 100000)
+        other = self.upload('other')
+        self.assertEqual(first.path, second.path)
+        self.assertNotEqual(first.hash, second.hash)
+        self.assertEqual(open(first.get_absolute_path()).read(), 'x' * 100000)
+        self.assertEqual(os.stat(first.get_absolute_path()).st_mode & 0777, 0644)
+        self.assertEqual(len(list(uploads._stored_files())), 2)
+
+        first.delete()
+        self.assertEqual(uploads.remove_orphans(0), (0, 0))
+        second.delete()
+        self.assertEqual(uploads.remove_orphans(), (0, 0))
+        self.assertEqual(uploads.remove_orphans(0), (1, 100000))
+        self.assertTrue(os.path.exists(other.get_absolute_path()))
@@ -1,9 +1,17 @@
 # -*- coding: utf-8 -*-
+from datetime import datetime
+
 from django.test import TestCase, RequestFactory
 from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.core.cache.backends import locmem
+from django.contrib.auth.models import User
 
-from djangobb_forum.models import Post
-from djangobb_forum.util import urlize, smiles, convert_text_to_html, paginate
+from djangobb_forum.models import Forum, Topic, Post
+from djangobb_forum.util import urlize, smiles, convert_text_to_html, paginate, KeysetList, \
+    process_html, _urlize_text, _smile_replacer, keyset_version
+from djangobb_forum import rendering
 
 
 class TestParsers(TestCase):
@@ -21,10 +29,47 @@ class TestParsers(TestCase):
         smiled_data = smiles(self.data_smiles)
         self.assertEqual(smiled_data, u"Lorem ipsum dolor <img src=\"{0}djangobb_forum/img/smilies/neutral.png\" /> sit amet <img src=\"{0}djangobb_forum/img/smilies/smile.png\" /> <a href=\"http://djangobb.org/\">http://djangobb.org/</a>".format(settings.STATIC_URL))
 
+    def test_smile_replacer(self):
+        from djangobb_forum.util import _smile_replacer, _sequential_smile_replacer
+        for data in (self.data_smiles, u':lol:) =) ;) :mad:o', u'::)) :/ http://x.org/ ##/## :P'):
+            self.assertEqual(_smile_replacer(data), _sequential_smile_replacer(data))
+
     def test_convert_text_to_html(self):
         bb_data = convert_text_to_html(self.bbcode, 'bbcode')
         self.assertEqual(bb_data, "<strong>Lorem</strong> <div class=\"code\"><pre>ipsum :)</pre></div>=)")
 
+    def test_single_pass(self):
+        for data in (self.data_url, self.data_smiles, u'<b>http://x.org/:) :)</b> &amp;) www.djangobb.org;)'):
+            self.assertEqual(process_html(data, [_urlize_text, _smile_replacer]), smiles(urlize(data)))
+        self.assertEqual(convert_text_to_html(self.bbcode, 'bbcode', True),
+                         smiles(convert_text_to_html(self.bbcode, 'bbcode')))
+
+    def test_urlize_quotes(self):
+        self.assertEqual(urlize(u'a@b.org"onmouseover=alert(1)'),
+                         u'<a href="mailto:a@b.org&quot;onmouseover=alert(1)">a@b.org&quot;onmouseover=alert(1)</a>')
+
+class TestRenderCache(TestCase):
+    def setUp(self):
+        rendering.cache.clear()
+
+    def test_render_html(self):
+        html = rendering.render_html(u'[b]Lorem[/b] :)', 'bbcode', True)
+        self.assertEqual(html, smiles(convert_text_to_html(u'[b]Lorem[/b] :)', 'bbcode')))
+        self.assertEqual(rendering.render_html(u'[b]Lorem[/b] :)', 'bbcode', True), html)
+        self.assertEqual(rendering.render_html(u'[b]Lorem[/b] :)', 'bbcode'),
+                         convert_text_to_html(u'[b]Lorem[/b] :)', 'bbcode'))
+        self.assertEqual(rendering.cache_info(),
+                         {'hits': 1, 'shared_hits': 0, 'misses': 2, 'size': 2})
+
+    def test_bounded(self):
+        render_cache = rendering.RenderCache(2, shared=locmem.CacheClass('render', {}))
+        for key in ('a', 'b', 'c'):
+            render_cache.set(key, key.upper())
+        self.assertEqual(render_cache.items.items.keys(), ['b', 'c'])
+        self.assertEqual(render_cache.get('a'), 'A')
+        self.assertEqual(render_cache.info(), {'hits': 0, 'shared_hits': 1, 'misses': 0, 'size': 2})
+
+
 class TestPaginators(TestCase):
     fixtures = ['test_forum.json']
 
@@ -41,6 +86,44 @@ class TestPaginators(TestCase):
         _, _, paged_list_name = paginate(self.posts, request, 3)
         self.assertEqual(paged_list_name.count(), 3)
 
+    def test_keyset_list(self):
+        cache.clear()
+        topic = Topic.objects.get(pk=1)
+        user = User.objects.get(pk=1)
+        for i in xrange(7):
+            Post.objects.create(topic=topic, user=user, body='body %d' % i)
+        # ties on created are ordered by id
+        Post.objects.filter(topic=topic, id__gt=8).update(created=datetime(2012, 1, 1))
+        expected = list(topic.posts.order_by('created', 'id'))
+        for cache_key in (None, 'test'):
+            posts = KeysetList(topic.posts.all(), ('created', 'id'), len(expected), cache_key)
+            paginator = Paginator(posts, 3)
+            self.assertEqual(paginator.num_pages, 4)
+            pages = [paginator.page(number).object_list for number in (1, 2, 3, 4)]
+            self.assertEqual(sum(pages, []), expected)
+            # seek from the cached anchor
+            self.assertEqual(paginator.page(3).object_list, expected[6:9])
+        # cold pages seek from the nearest cached anchor
+        cache.clear()
+        paginator = Paginator(KeysetList(topic.posts.all(), ('created', 'id'), len(expected), 'cold'), 3)
+        self.assertEqual(paginator.page(2).object_list, expected[3:6])
+        self.assertEqual(paginator.page(4).object_list, expected[9:])
+
+        Topic.objects.filter(pk=2).update(sticky=True)
+        forum = Forum.objects.get(pk=1)
+        for i in xrange(4):
+            Topic.objects.create(forum=forum, user=user, name='topic %d' % i, updated=datetime(2012, 1, 1))
+        # topics without posts yet are still ordered by updated
+        self.assertTrue(Topic.objects.create(forum=forum, user=user, name='empty').updated)
+        expected = list(forum.topics.order_by('-sticky', '-updated', '-id'))
+        topics = KeysetList(forum.topics.all(), ('-sticky', '-updated', '-id'), len(expected))
+        self.assertEqual(topics[0:2] + topics[2:4] + topics[4:6] + topics[6:8], expected)
+
+        version = keyset_version('forum_1')
+        topic.sticky = True
+        topic.save()
+        self.assertNotEqual(keyset_version('forum_1'), version)
+
 
 class TestVersion(TestCase):
     def test_get_version(self):
@@ -0,0 +1,149 @@
+"""
+Cached thumbnails of image attachments.
+
+A thumbnail is made on the first request of it and kept on disk under
+DJANGOBB_ATTACHMENT_THUMBNAILS_TO, named after the stored file of the
+attachment and size, so attachments sharing a file share thumbnails.
+Concurrent requests of a missing thumbnail wait shortly for the one
+making it, using a lock in the cache, instead of decoding the image each.
+Thumbnails of removed files are removed by ``remove_orphans``.
+"""
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+import os
+import re
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from djangobb_forum.models import Attachment
+from djangobb_forum import settings as forum_settings
+
+IMAGE_TYPES = ('image/png', 'image/gif', 'image/jpeg')
+
+# seconds a request may take making a thumbnail before others make it too
+LOCK_TIMEOUT = 30
+# seconds to wait for a thumbnail made by another request
+WAIT_TIMEOUT = 2
+
+TEMP_PREFIX = '.thumbnail-'
+
+_THUMBNAIL_RE = re.compile(r'^(.+)_\d+\.(?:jpg|png)$')
+
+
+def content_type(attachment):
+    """
+    Return content type of thumbnails of the attachment.
+    """
+    if attachment.content_type == 'image/jpeg':
+        return 'image/jpeg'
+    return 'image/png'
+
+
+def root():
+    return os.path.join(settings.MEDIA_ROOT, forum_settings.ATTACHMENT_THUMBNAILS_TO)
+
+
+def key(attachment):
+    """
+    Return name of the stored file of the attachment, the SHA1 of its
+    contents for files stored by ``uploads.store``.
+    """
+    return os.path.basename(attachment.path)
+
+
+def thumbnail_path(attachment, size):
+    ext = content_type(attachment) == 'image/jpeg' and 'jpg' or 'png'
+    name = key(attachment)
+    return os.path.join(root(), name[:2], '%s_%d.%s' % (name, size, ext))
+
+
+def _make(attachment, size, path):
+    try:
+        import Image
+    except ImportError:
+        from PIL import Image
+    image = Image.open(attachment.get_absolute_path())
+    image.draft('RGB', (size, size))
+    if content_type(attachment) == 'image/jpeg':
+        image = image.convert('RGB')
+        format = 'JPEG'
+    else:
+        image = image.convert('RGBA')
+        format = 'PNG'
+    image.thumbnail((size, size), Image.ANTIALIAS)
+    content = StringIO()
+    image.save(content, format=format, quality=85, optimize=True)
+
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    # readers never see a partly written file
+    fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(content.getvalue())
+        os.chmod(tmp_path, settings.FILE_UPLOAD_PERMISSIONS or 0644)
+        os.rename(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def get(attachment, size):
+    """
+    Return path of the thumbnail of the image attachment fitting a
+    ``size`` pixels square, made if missing, or None if another request
+    is still making it after ``WAIT_TIMEOUT`` seconds. Raises IOError for
+    images that can't be decoded.
+    """
+    path = thumbnail_path(attachment, size)
+    if os.path.exists(path):
+        return path
+    lock = 'djangobb_thumbnail_lock_%s' % os.path.basename(path)
+    deadline = time.time() + WAIT_TIMEOUT
+    while not cache.add(lock, 1, LOCK_TIMEOUT):
+        if os.path.exists(path):
+            return path
+        if time.time() > deadline:
+            return None
+        time.sleep(0.1)
+    try:
+        if not os.path.exists(path):
+            _make(attachment, size, path)
+    except (SyntaxError, ValueError), e:
+        raise IOError(str(e))
+    finally:
+        cache.delete(lock)
+    return path
+
+
+def remove_orphans(min_age=60 * 60):
+    """
+    Remove thumbnails of files no Attachment refers to and leftovers of
+    failed writes, which were not modified for ``min_age`` seconds.
+    Returns (number of files, bytes) removed.
+    """
+    keys = set(os.path.basename(path) for path in
+               Attachment.objects.values_list('path', flat=True).iterator())
+    count = size = 0
+    for dirpath, dirnames, filenames in os.walk(root()):
+        for filename in filenames:
+            match = _THUMBNAIL_RE.match(filename)
+            if match and match.group(1) in keys:
+                continue
+            if not match and not filename.startswith(TEMP_PREFIX):
+                continue
+            full_path = os.path.join(dirpath, filename)
+            stat = os.stat(full_path)
+            if time.time() - stat.st_mtime < min_age:
+                continue
+            os.remove(full_path)
+            count += 1
+            size += stat.st_size
+    return count, size
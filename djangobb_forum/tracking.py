@@ -0,0 +1,176 @@
+"""
+Storage backends for the read/unread state of topics.
+
+The backend is selected with DJANGOBB_POST_TRACKING_BACKEND:
+
+    'json'  - ids of topics and last read posts are stored as dict
+              in PostTracking.topics (limited to 5120 topics)
+    'table' - one indexed TopicTracking row per user and topic
+"""
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from djangobb_forum.models import Topic, PostTracking, TopicTracking
+from djangobb_forum import settings as forum_settings
+
+
+class BaseBackend(object):
+
+    def unread_forums(self, user, topics):
+        """
+        Return set of ids of forums which have unread topics among given ones.
+        """
+        rows = list(topics.values_list('id', 'forum', 'last_post'))
+        read_posts = self.read_posts(user, [topic_id for topic_id, forum_id, last_post_id in rows])
+        return set(forum_id for topic_id, forum_id, last_post_id in rows
+                   if last_post_id > read_posts.get(topic_id, 0))
+
+
+class JSONBackend(BaseBackend):
+
+    def read_posts(self, user, topic_ids):
+        topics = user.posttracking.topics
+        if not isinstance(topics, dict):
+            return {}
+        return dict((topic_id, topics[str(topic_id)]) for topic_id in topic_ids
+                    if str(topic_id) in topics)
+
+    def mark_read(self, user, topic):
+        tracking = user.posttracking
+        if isinstance(tracking.topics, dict):
+            #clear topics if len > 5Kb and set last_read to current time
+            if len(tracking.topics) > 5120:
+                tracking.topics = {}
+                tracking.last_read = datetime.now()
+            #update topics if exist new post or does't exist in dict
+            if topic.last_post_id > tracking.topics.get(str(topic.id), 0):
+                tracking.topics[str(topic.id)] = topic.last_post_id
+                tracking.save()
+        else:
+            #initialize topic tracking dict
+            tracking.topics = {str(topic.id): topic.last_post_id}
+            tracking.save()
+
+    def mark_all_read(self, user):
+        PostTracking.objects.filter(user__id=user.id).update(last_read=datetime.now(), topics=None)
+
+
+class TableBackend(BaseBackend):
+
+    def read_posts(self, user, topic_ids):
+        if not topic_ids:
+            return {}
+        return dict(TopicTracking.objects.filter(user__id=user.id, topic__id__in=topic_ids)\
+                    .values_list('topic', 'last_read_post'))
+
+    def unread_forums(self, user, topics):
+        read_topics = TopicTracking.objects.filter(user__id=user.id,
+                                last_read_post__gte=F('topic__last_post')).values('topic')
+        return set(topics.exclude(id__in=read_topics).order_by()\
+                   .values_list('forum', flat=True).distinct())
+
+    def mark_read(self, user, topic):
+        rows = TopicTracking.objects.filter(user__id=user.id, topic__id=topic.id)
+        if rows.filter(last_read_post__lt=topic.last_post_id).update(last_read_post=topic.last_post_id):
+            return
+        if rows.exists():
+            return
+        sid = transaction.savepoint()
+        try:
+            TopicTracking.objects.create(user=user, topic=topic, last_read_post=topic.last_post_id)
+        except IntegrityError:
+            # concurrent request has created the row
+            transaction.savepoint_rollback(sid)
+        else:
+            transaction.savepoint_commit(sid)
+
+    def mark_all_read(self, user):
+        PostTracking.objects.filter(user__id=user.id).update(last_read=datetime.now(), topics=None)
+        TopicTracking.objects.filter(user__id=user.id).delete()
+
+
+BACKENDS = {
+    'json': JSONBackend,
+    'table': TableBackend,
+}
+
+backend = BACKENDS[forum_settings.POST_TRACKING_BACKEND]()
+
+
+def read_posts(user, topic_ids):
+    """
+    Return dict of topic id -> id of the last post read by the user.
+    Topics which user never read are missing in the result.
+    """
+    return backend.read_posts(user, topic_ids)
+
+
+def mark_read(user, topic):
+    backend.mark_read(user, topic)
+
+
+def mark_all_read(user):
+    backend.mark_all_read(user)
+
+
+def annotate_topics(user, topics):
+    """
+    Set ``has_unreads`` flag on each of topics with a single lookup
+    of the tracking data.
+    """
+    unread = set()
+    if user.is_authenticated() and topics:
+        last_read = user.posttracking.last_read
+        candidates = [topic for topic in topics if last_read is None or\
+                      (topic.updated is not None and topic.updated >= last_read)]
+        read_posts = backend.read_posts(user, [topic.id for topic in candidates])
+        unread = set(topic.id for topic in candidates
+                     if topic.last_post_id > read_posts.get(topic.id, 0))
+    for topic in topics:
+        topic.has_unreads = topic.id in unread
+    return topics
+
+
+def annotate_forums(user, forums):
+    """
+    Set ``has_unreads`` flag on each of forums with one or two queries.
+    """
+    unread = set()
+    if user.is_authenticated() and forums:
+        topics = Topic.objects.filter(forum__id__in=[forum.id for forum in forums])
+        last_read = user.posttracking.last_read
+        if last_read:
+            topics = topics.filter(updated__gte=last_read)
+        unread = backend.unread_forums(user, topics)
+    for forum in forums:
+        forum.has_unreads = forum.id in unread
+    return forums
+
+
+class UnreadTopicList(object):
+    """
+    Lazy sequence of topics for paginated listings, unread flags
+    are computed in one batch for each fetched page.
+    """
+
+    def __init__(self, user, topics):
+        self.user = user
+        self.topics = topics
+
+    def count(self):
+        if isinstance(self.topics, list):
+            return len(self.topics)
+        return self.topics.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return annotate_topics(self.user, list(self.topics[key]))
+        return annotate_topics(self.user, [self.topics[key]])[0]
+
+    def __iter__(self):
+        return iter(annotate_topics(self.user, list(self.topics)))
@@ -0,0 +1,106 @@
+"""
+Content-addressed storage of attachment files.
+
+Uploads are streamed to a temporary file chunk by chunk while their SHA1
+is computed, then moved to ``<aa>/<bb>/<sha1>`` under the attachments
+directory. Identical uploads share one file, which is removed by
+``remove_orphans`` once no Attachment refers to it.
+"""
+from hashlib import sha1
+import os
+import re
+import tempfile
+import time
+
+from django.conf import settings
+
+from djangobb_forum.models import Attachment
+from djangobb_forum import settings as forum_settings
+
+TEMP_PREFIX = '.upload-'
+
+# files of attachments uploaded before content addressing
+_LEGACY_RE = re.compile(r'^\d+\.\d+$')
+_FANOUT_RE = re.compile(r'^[0-9a-f]{2}$')
+
+
+def root():
+    return os.path.join(settings.MEDIA_ROOT, forum_settings.ATTACHMENT_UPLOAD_TO)
+
+
+def blob_path(digest):
+    """
+    Return path of the file with given SHA1, relative to the attachments directory.
+    """
+    return os.path.join(digest[:2], digest[2:4], digest)
+
+
+def store(uploaded_file):
+    """
+    Write the uploaded file to its content-addressed place, unless the
+    same contents are stored already. Returns the relative path.
+    """
+    directory = root()
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=directory)
+    digest = sha1()
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in uploaded_file.chunks():
+                digest.update(chunk)
+                tmp.write(chunk)
+        path = blob_path(digest.hexdigest())
+        full_path = os.path.join(directory, path)
+        if os.path.exists(full_path):
+            # keeps it from remove_orphans until the Attachment is saved
+            os.utime(full_path, None)
+            os.remove(tmp_path)
+        else:
+            if not os.path.isdir(os.path.dirname(full_path)):
+                os.makedirs(os.path.dirname(full_path))
+            # mkstemp makes it private, web servers sending it may run as another user
+            os.chmod(tmp_path, settings.FILE_UPLOAD_PERMISSIONS or 0644)
+            os.rename(tmp_path, full_path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def _stored_files():
+    directory = root()
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if _LEGACY_RE.match(name) or name.startswith(TEMP_PREFIX):
+            yield name
+        elif _FANOUT_RE.match(name):
+            for dirpath, dirnames, filenames in os.walk(os.path.join(directory, name)):
+                for filename in filenames:
+                    yield os.path.relpath(os.path.join(dirpath, filename), directory)
+
+
+def remove_orphans(min_age=60 * 60):
+    """
+    Remove stored files no Attachment refers to and leftovers of failed
+    uploads, which were not modified for ``min_age`` seconds.
+    Returns (number of files, bytes) removed.
+    """
+    references = {}
+    for path in Attachment.objects.values_list('path', flat=True).iterator():
+        references[path] = references.get(path, 0) + 1
+    directory = root()
+    count = size = 0
+    for path in _stored_files():
+        if references.get(path):
+            continue
+        full_path = os.path.join(directory, path)
+        stat = os.stat(full_path)
+        if time.time() - stat.st_mtime < min_age:
+            continue
+        os.remove(full_path)
+        count += 1
+        size += stat.st_size
+    return count, size
@@ -103,4 +103,6 @@ if (forum_settings.REPUTATION_SUPPORT):
 if (forum_settings.ATTACHMENT_SUPPORT):
     urlpatterns += patterns('',
         url('^attachment/(?P<hash>\w+)/$', forum_views.show_attachment, name='forum_attachment'),
+        url('^attachment/(?P<hash>\w+)/thumbnail/(?P<size>\d+)/$', forum_views.show_attachment_thumbnail,
+            name='forum_attachment_thumbnail'),
     )
@@ -1,5 +1,12 @@
 import re
+import threading
+import time
 from HTMLParser import HTMLParser
+try:
+    from collections import OrderedDict
+except ImportError:
+    # Python 2.6
+    from django.utils.datastructures import SortedDict as OrderedDict
 from postmarkup import render_bbcode
 try:
     import markdown
@@ -14,6 +21,8 @@ from django.utils.translation import force_unicode, check_for_language
 from django.utils.simplejson import JSONEncoder
 from django.template.defaultfilters import urlize as django_urlize
 from django.core.paginator import Paginator, EmptyPage, InvalidPage
+from django.core.cache import cache
+from django.db.models import Q
 from django.contrib.sites.models import Site
 
 from djangobb_forum import settings as forum_settings
@@ -23,6 +32,31 @@ from djangobb_forum import settings as forum_settings
 _SMILES = [(re.compile(smile_re), path) for smile_re, path in forum_settings.SMILES]
 
 
+def _compile_smiles_alternation():
+    """
+    Return one regexp with a named group per smile, or None if the
+    smiles can't be combined (backreferences, own named groups, empty
+    matches, escapes or smiles in replacements).
+    """
+    if any('\\' in path for smile_re, path in forum_settings.SMILES):
+        return None
+    try:
+        regexp = re.compile('|'.join('(?P<smile%d>%s)' % (i, smile_re)
+                                     for i, (smile_re, path) in enumerate(forum_settings.SMILES)))
+    except re.error:
+        return None
+    if len(regexp.groupindex) != len(_SMILES) or regexp.match(''):
+        return None
+    for smile_re, path in forum_settings.SMILES:
+        # inserted smiles must stay untouched by the following ones
+        if regexp.search(path.replace('/', '##/##').replace(':', '##:##')):
+            return None
+    return regexp
+
+_SMILES_RE = _compile_smiles_alternation()
+_SMILES_PATHS = dict(('smile%d' % i, path) for i, (smile_re, path) in enumerate(forum_settings.SMILES))
+
+
 def absolute_url(path):
     return 'http://%s%s' % (Site.objects.get_current().domain, path)
 
@@ -114,11 +148,16 @@ def build_form(Form, _request, GET=False, *args, **kwargs):
 class ExcludeTagsHTMLParser(HTMLParser):
         """
         Class for html parsing with excluding specified tags.
+
+        ``func`` is a text transform or a list of them, applied in order
+        to text outside of the excluded tags in one pass over the html.
         """
 
         def __init__(self, func, tags=('a', 'pre', 'span')):
             HTMLParser.__init__(self)
-            self.func = func
+            if callable(func):
+                func = [func]
+            self.func = _chain(func, tags)
             self.is_ignored = False
             self.tags = tags
             self.html = []
@@ -156,11 +195,78 @@ class ExcludeTagsHTMLParser(HTMLParser):
                 _attrs = ' %s' % (' '.join([('%s="%s"' % (k,v)) for k,v in attrs]))
             return _attrs
 
-        def feed(self, data):
-            HTMLParser.feed(self, data)
+        def close(self):
+            HTMLParser.close(self)
             self.html = ''.join(self.html)
 
 
+# tags and references in the output of text transforms
+_TAG_RE = re.compile(r'<(/?)([a-zA-Z][-.a-zA-Z0-9:_]*)[^>]*>|&#?[a-zA-Z0-9]+;')
+
+
+def _chain(transforms, tags):
+    """
+    Return function applying transforms one after another. Markup made by
+    a transform is handled by the following ones as ExcludeTagsHTMLParser
+    would handle it in a separate pass.
+    """
+    first, rest = transforms[0], transforms[1:]
+    if not rest:
+        return first
+
+    def apply(data):
+        data = first(data)
+        for func in rest:
+            if '<' in data or '&' in data:
+                data = _transform_text(func, data, tags)
+            else:
+                data = func(data)
+        return data
+    return apply
+
+
+def _transform_text(func, html, tags):
+    result = []
+    position = 0
+    is_ignored = False
+    for match in _TAG_RE.finditer(html):
+        text = html[position:match.start()]
+        if text and not is_ignored:
+            text = func(text)
+        result.append(text)
+        result.append(match.group(0))
+        if match.group(1):
+            is_ignored = False
+        elif match.group(2) and match.group(2).lower() in tags \
+                and not match.group(0).endswith('/>'):
+            is_ignored = True
+        position = match.end()
+    text = html[position:]
+    if text and not is_ignored:
+        text = func(text)
+    result.append(text)
+    return ''.join(result)
+
+
+def process_html(data, transforms, tags=('a', 'pre', 'span')):
+    """
+    Apply the text transforms to the HTML contents, skipping contents
+    of excluded tags. The HTML is parsed once for all the transforms.
+    """
+    parser = ExcludeTagsHTMLParser(transforms, tags)
+    parser.feed(data)
+    parser.close()
+    return parser.html
+
+
+def _urlize_text(data):
+    # django's urlize leaves words without these characters as they are
+    if '.' not in data and '@' not in data and ':' not in data:
+        return data
+    # quotes of the text would end href attributes of the links
+    return django_urlize(data.replace('"', '&quot;'))
+
+
 def urlize(data):
     """
     Urlize plain text links in the HTML contents.
@@ -168,14 +274,38 @@ def urlize(data):
     Do not urlize content of A and CODE tags.
     """
 
-    parser = ExcludeTagsHTMLParser(django_urlize)
-    parser.feed(data)
-    urlized_html = parser.html
-    parser.close()
-    return urlized_html
+    return process_html(data, [_urlize_text])
 
 
 def _smile_replacer(data):
+    """
+    Replace smiles in a single scan of the data.
+
+    Smiles are applied one after another by the sequential replacer, so
+    an earlier smile wins over a later one even when it starts later in
+    the text (``:lol:)`` gives ``:lol`` and a smile). One scan yields the
+    same result unless a match contains the start of another match, and
+    such data is passed to the sequential replacer.
+    """
+    if _SMILES_RE is None or '##' in data:
+        return _sequential_smile_replacer(data)
+    result = []
+    position = 0
+    for match in _SMILES_RE.finditer(data):
+        start, end = match.span()
+        for inner in xrange(start + 1, end):
+            if _SMILES_RE.match(data, inner):
+                return _sequential_smile_replacer(data)
+        result.append(data[position:start])
+        result.append(_SMILES_PATHS[match.lastgroup])
+        position = end
+    if not position:
+        return data
+    result.append(data[position:])
+    return ''.join(result)
+
+
+def _sequential_smile_replacer(data):
     for smile, path in _SMILES:
         path = path.replace('/', '##/##')
         path = path.replace(':', '##:##')
@@ -190,11 +320,7 @@ def smiles(data):
     Replace text smiles.
     """
 
-    parser = ExcludeTagsHTMLParser(_smile_replacer)
-    parser.feed(data)
-    smiled_html = parser.html
-    parser.close()
-    return smiled_html
+    return process_html(data, [_smile_replacer])
 
 def paginate(items, request, per_page, total_count=None):
     try:
@@ -210,6 +336,197 @@ def paginate(items, request, per_page, total_count=None):
         raise Http404
     return pages, paginator, paged_list_name 
 
+class LRUCache(object):
+    """
+    Thread-safe in-process mapping holding at most ``size`` items,
+    the least recently used are dropped first.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                return default
+            value = self.items[key] = self.items.pop(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            while len(self.items) > self.size:
+                del self.items[iter(self.items).next()]
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class PeriodicBuffer(object):
+    """
+    In-process dict of pending writes, handed to ``write`` at most once
+    per ``interval`` seconds by a later ``add`` or by ``flush``.
+    Subclasses define ``write`` and may change how values are merged.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.pending = {}
+        self.flushed = time.time()
+        self.lock = threading.Lock()
+
+    def merge(self, key, value):
+        self.pending[key] = value
+
+    def add(self, key, value):
+        with self.lock:
+            self.merge(key, value)
+        if time.time() - self.flushed >= self.interval:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.flushed = time.time()
+        if pending:
+            self.write(pending)
+
+    def write(self, pending):
+        raise NotImplementedError
+
+
+def keyset_version(name):
+    """
+    Return token to put in cache keys of KeysetList anchors of the named
+    listing, changed by ``invalidate_keyset``.
+    """
+    key = 'djangobb_keyset_version_%s' % name
+    version = cache.get(key)
+    if version is None:
+        # a fresh token, anchors of an evicted version are never reused
+        cache.add(key, '%x' % int(time.time() * 1000000))
+        version = cache.get(key)
+    return version
+
+
+def invalidate_keyset(name):
+    """
+    Drop cached anchors of the named listing, when rows are reordered
+    without changing the counts in the cache key.
+    """
+    cache.delete('djangobb_keyset_version_%s' % name)
+
+
+class KeysetList(object):
+    """
+    Sequence over an ordered queryset for Paginator and autopaginate.
+
+    Pages are fetched by seeking on the ordering ``keys`` (e.g.
+    ``('created', 'id')``) instead of OFFSET. The first key of a page
+    (anchor) is taken from the previous page when it is cached under
+    ``cache_key``. Otherwise it is looked up on the key columns alone,
+    seeking from the nearest cached anchor of one of the previous
+    ``LOOKBACK`` pages, or with OFFSET when none is cached.
+    ``count`` is the known number of rows, so no COUNT(*) is issued.
+    """
+    LOOKBACK = 50
+
+    def __init__(self, queryset, keys, count, cache_key=None):
+        self.queryset = queryset.order_by(*keys)
+        self.keys = keys
+        self.fields = [key.lstrip('-') for key in keys]
+        self._count = count
+        self.cache_key = cache_key
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def _anchor_key(self, index):
+        return 'djangobb_keyset_%s_%d' % (self.cache_key, index)
+
+    def _seek(self, values, inclusive):
+        """
+        Return Q for rows following the row with given key values.
+        """
+        query = Q()
+        for i, (key, field) in enumerate(zip(self.keys, self.fields)):
+            last = i == len(self.keys) - 1
+            lookup = key.startswith('-') and 'lt' or 'gt'
+            if last and inclusive:
+                lookup += 'e'
+            condition = Q(**{'%s__%s' % (field, lookup): values[i]})
+            for prev_field, value in zip(self.fields[:i], values[:i]):
+                condition &= Q(**{prev_field: value})
+            query |= condition
+        return query
+
+    def _anchor(self, index, step):
+        queryset = self.queryset
+        offset = index
+        if self.cache_key:
+            indexes = range(index, 0, -step)[:self.LOOKBACK + 1]
+            anchors = cache.get_many([self._anchor_key(i) for i in indexes])
+            for i in indexes:
+                anchor = anchors.get(self._anchor_key(i))
+                if anchor is None:
+                    continue
+                if i == index:
+                    return anchor
+                values, inclusive = anchor
+                if None not in values:
+                    queryset = queryset.filter(self._seek(values, inclusive))
+                    offset = index - i
+                break
+        rows = list(queryset.values_list(*self.fields)[offset:offset + 1])
+        if not rows:
+            return None
+        anchor = (rows[0], True)
+        if self.cache_key:
+            cache.set(self._anchor_key(index), anchor)
+        return anchor
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        if key.stop is None:
+            return list(self.queryset[start:])
+        if start == 0:
+            items = list(self.queryset[:key.stop])
+        else:
+            anchor = self._anchor(start, key.stop - start)
+            if anchor is None:
+                return []
+            values, inclusive = anchor
+            if None in values:
+                # NULLs can't be compared, fall back to OFFSET
+                items = list(self.queryset[start:key.stop])
+            else:
+                items = list(self.queryset.filter(self._seek(values, inclusive))[:key.stop - start])
+        if self.cache_key and items:
+            last = items[-1]
+            cache.set(self._anchor_key(start + len(items)),
+                      (tuple(getattr(last, field) for field in self.fields), False))
+        return items
+
+    def __iter__(self):
+        return iter(self.queryset)
+
+
 def set_language(request, language):
     """
     Change the language of session of authenticated user.
@@ -219,11 +536,18 @@ def set_language(request, language):
         request.session['django_language'] = language
 
 
-def convert_text_to_html(text, markup):
+def convert_text_to_html(text, markup, smilies=False):
+    """
+    Render the text in given markup to HTML with urlized links, and
+    smiles if requested, in a single pass over the rendered HTML.
+    """
     if markup == 'bbcode':
         text = render_bbcode(text)
     elif markup == 'markdown':
         text = markdown.markdown(text, safe_mode='escape')
     else:
         raise Exception('Invalid markup property: %s' % markup)
-    return urlize(text)
+    transforms = [_urlize_text]
+    if smilies:
+        transforms.append(_smile_replacer)
+    return process_html(text, transforms)
@@ -1,28 +1,35 @@
 import math
+import os
 from datetime import datetime, timedelta 
 
 from django.shortcuts import get_object_or_404, render
-from django.http import Http404, HttpResponse, HttpResponseRedirect, HttpResponseForbidden
+from django.http import Http404, HttpResponseRedirect, HttpResponseForbidden
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib.sites.models import Site
 from django.core.urlresolvers import reverse
-from django.core.cache import cache
-from django.db.models import Q, F, Sum
-from django.utils.encoding import smart_str
+from django.db.models import Q, Sum
 from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
 
-from djangobb_forum.util import build_form, paginate, set_language
+from djangobb_forum.util import build_form, paginate, set_language, KeysetList, keyset_version, \
+    invalidate_keyset
 from djangobb_forum.models import Category, Forum, Topic, Post, Profile, Reputation,\
     Attachment, PostTracking
 from djangobb_forum.forms import AddPostForm, EditPostForm, UserSearchForm,\
     PostSearchForm, ReputationForm, MailToForm, EssentialsProfileForm,\
     PersonalProfileForm, MessagingProfileForm, PersonalityProfileForm,\
     DisplayProfileForm, PrivacyProfileForm, ReportForm, UploadAvatarForm
-from djangobb_forum.templatetags import forum_extras
 from djangobb_forum import settings as forum_settings
-from djangobb_forum.util import smiles, convert_text_to_html
+from djangobb_forum import counters
+from djangobb_forum import tracking
+from djangobb_forum import presence
+from djangobb_forum import access
+from djangobb_forum import prefetch
+from djangobb_forum import rerender
+from djangobb_forum import downloads
+from djangobb_forum import thumbnails
+from djangobb_forum.rendering import render_html
 from djangobb_forum.templatetags.forum_extras import forum_moderated_by
 from djangobb_forum.decorators import require_unbanned_user
 from djangobb_forum.auth import unbanned_user_requirement, isa_forum_moderator
@@ -33,28 +40,41 @@ from haystack.query import SearchQuerySet, SQ
 
 
 
+def _forum_topics(forum):
+    topics = forum.topics.select_related()
+    if forum_settings.KEYSET_PAGINATION:
+        # stick, unstick and move change the order with the same counts
+        version = keyset_version('forum_%d' % forum.id)
+        return KeysetList(topics, ('-sticky', '-updated', '-id'), forum.topic_count,
+                          'forum_%d_%s_%d_%s' % (forum.id, version, forum.topic_count,
+                                                 forum.last_post_id))
+    return topics.order_by('-sticky', '-updated')
+
+
+def _topic_posts(topic):
+    posts = topic.posts.select_related('user', 'updated_by')
+    if forum_settings.KEYSET_PAGINATION:
+        return KeysetList(posts, ('created', 'id'), topic.post_count,
+                          'topic_%d_%d_%s' % (topic.id, topic.post_count, topic.last_post_id))
+    return posts
+
+
 def index(request, full=True):
-    users_cached = cache.get('djangobb_users_online', {})
-    users_online = users_cached and User.objects.filter(id__in = users_cached.keys()) or []
-    guests_cached = cache.get('djangobb_guests_online', {})
-    guest_count = len(guests_cached)
+    users_cached = presence.users.members()
+    users_online = users_cached and User.objects.filter(id__in=users_cached) or []
+    guest_count = presence.guests.count()
     users_count = len(users_online)
 
     cats = {}
     forums = {}
-    user_groups = request.user.groups.all()
-    if request.user.is_anonymous():  # in django 1.1 EmptyQuerySet raise exception
-        user_groups = []
-
-    _categories = Category.objects\
-        .filter(language=get_language())\
-        .filter(Q(groups__in=user_groups)|Q(groups__isnull=True))\
-
-    _forums = Forum.objects.filter(category__in=_categories)\
+    _forums = Forum.objects.filter(id__in=access.visible_forum_ids(request.user),
+                                   category__language=get_language())\
         .select_related('last_post__topic', 'last_post__user', 'category')
+    _forums = tracking.annotate_forums(request.user, list(_forums))
+    forum_ids = [forum.id for forum in _forums]
 
-    _topics = Topic.objects.filter(forum__in=_forums)
-    _posts = Post.objects.filter(topic__in=_topics)
+    _topics = Topic.objects.filter(forum__id__in=forum_ids)
+    _posts = Post.objects.filter(topic__forum__id__in=forum_ids)
 
     for forum in _forums:
         cat = cats.setdefault(forum.category.id,
@@ -83,7 +103,7 @@ def index(request, full=True):
 @transaction.commit_on_success
 def moderate(request, forum_id):
     forum = get_object_or_404(Forum, pk=forum_id)
-    topics = forum.topics.order_by('-sticky', '-updated').select_related()
+    topics = _forum_topics(forum)
     if isa_forum_moderator(forum, request.user):
         topic_ids = request.POST.getlist('topic_id')
         if 'move_topics' in request.POST:
@@ -107,7 +127,7 @@ def moderate(request, forum_id):
             return HttpResponseRedirect(reverse('djangobb:index'))
 
         return render(request, 'djangobb_forum/moderate.html', {'forum': forum,
-                'topics': topics,
+                'topics': tracking.UnreadTopicList(request.user, topics),
                 #'sticky_topics': forum.topics.filter(sticky=True),
                 'posts': forum.posts.count(),
                 })
@@ -121,10 +141,9 @@ def search(request):
         action = request.GET['action']
         #FIXME: show_user for anonymous raise exception, 
         #django bug http://code.djangoproject.com/changeset/14087 :|
-        groups = request.user.groups.all() or [] #removed after django > 1.2.3 release
-        topics = Topic.objects.filter(forum__category__language=get_language()).filter(
-                   Q(forum__category__groups__in=groups) | \
-                   Q(forum__category__groups__isnull=True))
+        forum_ids = access.visible_forum_ids(request.user)
+        topics = Topic.objects.filter(forum__id__in=forum_ids,
+                                      forum__category__language=get_language())
         if action == 'show_24h':
             date = datetime.today() - timedelta(1)
             topics = topics.filter(created__gte=date)
@@ -137,19 +156,18 @@ def search(request):
                 post_tracking = None
             if last_read:
                 topics = topics.filter(Q(last_post__updated__gte=last_read)|Q(last_post__created__gte=last_read))
-                read_posts = (post_tracking.topics if post_tracking else None) or {}
-
-                def is_topic_unread(topic_id, last_post_id):
-                    return last_post_id>read_posts.get(str(topic_id),0)
+                last_posts = list(topics.values_list('pk', 'last_post'))
+                read_posts = tracking.read_posts(request.user,
+                                    [topic_id for topic_id, last_post_id in last_posts])
 
-                unread_topics = [topic_id for topic_id, last_post_id\
-                            in topics.values_list('pk', 'last_post')\
-                            if is_topic_unread(topic_id, last_post_id)]
+                unread_topics = [topic_id for topic_id, last_post_id in last_posts\
+                            if last_post_id > read_posts.get(topic_id, 0)]
 
                 topics = topics.filter(pk__in=unread_topics)
             else:
                 #searching more than forum_settings.SEARCH_PAGE_SIZE in this way - not good idea :]
-                topics = [topic for topic in topics[:forum_settings.SEARCH_PAGE_SIZE] if forum_extras.has_unreads(topic, request.user)]
+                topics = tracking.annotate_topics(request.user, list(topics[:forum_settings.SEARCH_PAGE_SIZE]))
+                topics = [topic for topic in topics if topic.has_unreads]
         elif action == 'show_unanswered':
             topics = topics.filter(post_count=1)
         elif action == 'show_subscriptions':
@@ -201,17 +219,20 @@ def search(request):
                     if post.object is None:
                         posts = posts.exclude(django_id=post.django_id)
                     elif post.object.topic not in topics:
-                        if post.object.topic.forum.category.has_access(request.user):
+                        if post.object.topic.forum_id in forum_ids:
                             topics.append(post.object.topic)
                         else:
                             topics_to_exclude |= SQ(topic=post.object.topic)
 
                 if topics_to_exclude:
                     posts = posts.exclude(topics_to_exclude)
-                return render(request, 'djangobb_forum/search_topics.html', {'results': topics})
+                return render(request, 'djangobb_forum/search_topics.html', {
+                    'results': tracking.UnreadTopicList(request.user, topics)})
             elif 'posts' in request.GET['show_as']:
-                return render(request, 'djangobb_forum/search_posts.html', {'results': posts})
-        return render(request, 'djangobb_forum/search_topics.html', {'results': topics})
+                return render(request, 'djangobb_forum/search_posts.html',
+                              {'results': prefetch.SearchPage(posts)})
+        return render(request, 'djangobb_forum/search_topics.html', {
+            'results': tracking.UnreadTopicList(request.user, topics)})
     else:
         form = PostSearchForm()
         return render(request, 'djangobb_forum/search_form.html', {'categories': Category.objects.all(),
@@ -225,8 +246,7 @@ def misc(request):
     if 'action' in request.GET:
         action = request.GET['action']
         if action =='markread':
-            user = request.user
-            PostTracking.objects.filter(user__id=user.id).update(last_read=datetime.now(), topics=None)
+            tracking.mark_all_read(request.user)
             return HttpResponseRedirect(reverse('djangobb:index'))
 
         elif action == 'report':
@@ -264,12 +284,12 @@ def show_forum(request, forum_id, full=True):
         return HttpResponseRedirect(reverse('djangobb:index'))
     if not forum.category.has_access(request.user):
         return HttpResponseForbidden()
-    topics = forum.topics.order_by('-sticky', '-updated').select_related()
+    topics = _forum_topics(forum)
     moderator = isa_forum_moderator(forum, request.user)
     to_return = {'categories': Category.objects.all(),
                 'forum': forum,
                 'posts': forum.post_count,
-                'topics': topics,
+                'topics': tracking.UnreadTopicList(request.user, topics),
                 'moderator': moderator,
                 }
     if full:
@@ -278,20 +298,20 @@ def show_forum(request, forum_id, full=True):
         return render(request, 'djangobb_forum/lofi/forum.html', to_return)
 
 
-@transaction.commit_on_success
 def show_topic(request, topic_id, full=True):
     topic = get_object_or_404(Topic.objects.select_related(), pk=topic_id)
     if not topic.forum.category.language == request.LANGUAGE_CODE:
         return HttpResponseRedirect(reverse('djangobb:index'))
     if not topic.forum.category.has_access(request.user):
         return HttpResponseForbidden()
-    Topic.objects.filter(pk=topic.id).update(views=F('views') + 1)
+    topic.views += counters.topic_views.get(topic.id) + 1
+    counters.topic_views.add(topic.id, 1)
 
     last_post = topic.last_post
 
     if request.user.is_authenticated():
         topic.update_read(request.user)
-    posts = topic.posts.all().select_related()
+    posts = prefetch.PostPage(topic, _topic_posts(topic))
 
     initial = {}
     if request.user.is_authenticated():
@@ -340,9 +360,9 @@ def add_post(request, forum_id, topic_id):
         topic = get_object_or_404(Topic, pk=topic_id)
         if not topic.forum.category.language == request.LANGUAGE_CODE:
             return HttpResponseRedirect(reverse('djangobb:index'))
-        posts = topic.posts.all().select_related()
         if not topic.forum.category.has_access(request.user):
             return HttpResponseForbidden()
+        posts = rerender.load_html(topic.posts.all().select_related())
     if topic and topic.closed:
         return HttpResponseRedirect(topic.get_absolute_url())
 
@@ -478,12 +498,16 @@ def reputation(request, username):
 
 
 def show_post(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.select_related('topic__forum__category'), pk=post_id)
     if not post.topic.forum.category.language == request.LANGUAGE_CODE:
         return HttpResponseRedirect(reverse('djangobb:index'))
-    count = post.topic.posts.filter(created__lt=post.created).count() + 1
-    page = math.ceil(count / float(forum_settings.TOPIC_PAGE_SIZE))
-    url = '%s?page=%d#post-%d' % (reverse('djangobb:topic', args=[post.topic.id]), page, post.id)
+    position = post.position
+    if not position:
+        # not numbered yet, see djangobb_repair_positions
+        position = post.topic.posts.filter(Q(created__lt=post.created) |
+                                           Q(created=post.created, id__lt=post.id)).count() + 1
+    page = math.ceil(position / float(forum_settings.TOPIC_PAGE_SIZE))
+    url = '%s?page=%d#post-%d' % (reverse('djangobb:topic', args=[post.topic_id]), page, post.id)
     return HttpResponseRedirect(url)
 
 
@@ -531,7 +555,7 @@ def delete_posts(request, topic_id):
     if request.user.is_authenticated():
         topic.update_read(request.user)
 
-    posts = topic.posts.all().select_related()
+    posts = prefetch.PostPage(topic, topic.posts.select_related('user', 'updated_by'))
 
     initial = {}
     if request.user.is_authenticated():
@@ -572,18 +596,11 @@ def move_topic(request):
             topic = get_object_or_404(Topic, pk=topic_id)
             if topic.forum != to_forum:
                 if forum_moderated_by(topic, request.user):
+                    old_forum = topic.forum
                     topic.forum = to_forum
                     topic.save()
-
-        #TODO: not DRY
-        try:
-            last_post = Post.objects.filter(topic__forum__id=from_forum.id).latest()
-        except Post.DoesNotExist:
-            last_post = None
-        from_forum.last_post = last_post
-        from_forum.topic_count = from_forum.topics.count()
-        from_forum.post_count = from_forum.posts.count()
-        from_forum.save()
+                    counters.topic_moved(topic, old_forum, to_forum)
+                    invalidate_keyset('forum_%d' % old_forum.id)
         return HttpResponseRedirect(to_forum.get_absolute_url())
 
     return render(request, 'djangobb_forum/move_topic.html', {'categories': Category.objects.all(),
@@ -684,10 +701,27 @@ def add_subscription(request, topic_id):
 @require_unbanned_user
 def show_attachment(request, hash):
     attachment = get_object_or_404(Attachment, hash=hash)
-    file_data = file(attachment.get_absolute_path(), 'rb').read()
-    response = HttpResponse(file_data, mimetype=attachment.content_type)
-    response['Content-Disposition'] = 'attachment; filename="%s"' % smart_str(attachment.name)
-    return response
+    return downloads.serve_file(request, attachment.get_absolute_path(), attachment.content_type,
+                                attachment.name, attachment.hash)
+
+
+@login_required
+@require_unbanned_user
+def show_attachment_thumbnail(request, hash, size):
+    attachment = get_object_or_404(Attachment, hash=hash)
+    size = int(size)
+    if size not in forum_settings.ATTACHMENT_THUMBNAIL_SIZES or \
+            attachment.content_type not in thumbnails.IMAGE_TYPES:
+        raise Http404
+    try:
+        path = thumbnails.get(attachment, size)
+    except IOError:
+        raise Http404
+    if path is None:
+        # still being made by another request
+        return HttpResponseRedirect(attachment.get_absolute_url())
+    return downloads.serve_file(request, path, thumbnails.content_type(attachment), attachment.name,
+                                os.path.basename(path), inline=True)
 
 
 @login_required
@@ -698,7 +732,5 @@ def post_preview(request):
     markup = request.user.forum_profile.markup
     data = request.POST.get('data', '')
 
-    data = convert_text_to_html(data, markup)
-    if forum_settings.SMILES_SUPPORT:
-        data = smiles(data)
+    data = render_html(data, markup, forum_settings.SMILES_SUPPORT)
     return render(request, 'djangobb_forum/post_preview.html', {'data': data})
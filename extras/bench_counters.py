@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+Measure the cost of adding a post while the forum grows.
+
+Run it from a configured DjangoBB project against a scratch database:
+
+    DJANGO_SETTINGS_MODULE=settings python bench_counters.py 1000 10000 100000 1000000
+"""
+import sys
+import time
+
+from django.contrib.auth.models import User
+
+from djangobb_forum.models import Category, Forum, Topic, Post
+
+CHUNK = 10000
+SAMPLES = 50
+
+
+def grow(topic, user, count):
+    while count > 0:
+        size = min(count, CHUNK)
+        Post.objects.bulk_create([Post(topic=topic, user=user, body='filler',
+                                       body_html='filler') for i in xrange(size)])
+        count -= size
+
+
+def main(sizes):
+    user, created = User.objects.get_or_create(username='bench_counters')
+    category = Category.objects.create(name='bench')
+    forum = Forum.objects.create(category=category, name='bench')
+    topic = Topic.objects.create(forum=forum, user=user, name='bench')
+    current = 0
+    for size in sorted(int(size) for size in sizes):
+        grow(topic, user, size - current)
+        current = size
+        start = time.time()
+        for i in xrange(SAMPLES):
+            Post.objects.create(topic=topic, user=user, body='Test body %d' % i)
+        elapsed = (time.time() - start) / SAMPLES
+        current += SAMPLES
+        print '%10d posts: %.2f ms per post' % (size, elapsed * 1000)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or [1000, 10000, 100000, 1000000])
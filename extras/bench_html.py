@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Compare the single pass post-processing of rendered posts (links and
+smiles) with separate urlize and smiles passes on 100 KB posts.
+
+Run it from a configured DjangoBB project:
+
+    DJANGO_SETTINGS_MODULE=settings python bench_html.py [posts]
+"""
+import sys
+import time
+
+from postmarkup import render_bbcode
+
+from djangobb_forum import util
+
+ROUNDS = 3
+POST_SIZE = 100 * 1024
+
+PARAGRAPHS = [
+    u"Thanks, that fixed it :) I was looking at the wrong settings file the whole time.",
+    u"Try [b]python manage.py syncdb[/b] first =) and check http://docs.djangoproject.com/ for details.",
+    u"[quote=admin]No idea :/ maybe ask on the mailing list at www.djangobb.org?[/quote] It worked for me :(",
+    u"[code]for post in Post.objects.all():\n    post.save()  # :)[/code]",
+    u"Write to support@example.com or see [url=http://djangobb.org/]the site[/url] ;)",
+    u"A long paragraph without any smiles at all, which is what most of the text looks like "
+    u"in a technical forum: tracebacks, settings, versions and explanations of what was tried.",
+]
+
+
+def make_post(seed):
+    text = []
+    size = 0
+    i = seed
+    while size < POST_SIZE:
+        paragraph = PARAGRAPHS[i % len(PARAGRAPHS)]
+        text.append(paragraph)
+        size += len(paragraph) + 2
+        i += 1
+    return u'\n\n'.join(text)
+
+
+def two_passes(html):
+    return util.smiles(util.urlize(html))
+
+
+def single_pass(html):
+    return util.process_html(html, [util._urlize_text, util._smile_replacer])
+
+
+def bench(name, func, corpus):
+    start = time.time()
+    for i in xrange(ROUNDS):
+        for html in corpus:
+            func(html)
+    elapsed = time.time() - start
+    size = sum(len(html) for html in corpus) * ROUNDS
+    print '%-10s %8.1f ms, %6.2f MB/s' % (name, elapsed * 1000, size / elapsed / 2 ** 20)
+    return elapsed
+
+
+def main(count):
+    corpus = [render_bbcode(make_post(i)) for i in xrange(count)]
+    for html in corpus:
+        assert two_passes(html) == single_pass(html)
+    two = bench('two passes', two_passes, corpus)
+    single = bench('one pass', single_pass, corpus)
+    print 'speedup    %8.1fx' % (two / single)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
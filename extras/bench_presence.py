@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Compare per-request cost of online tracking with 10k concurrent guests:
+the former UsersOnline dicts against djangobb_forum.presence buckets.
+
+    python bench_presence.py [guests]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+settings.configure(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'OPTIONS': {'MAX_ENTRIES': 100000}}})
+
+from django.core.cache import cache
+
+from djangobb_forum.presence import Presence
+
+TIMEOUT = 15 * 60
+REQUESTS = 2000
+
+
+def dict_request(guest_sid):
+    now = datetime.now()
+    delta = now - timedelta(seconds=TIMEOUT)
+    users_online = cache.get('djangobb_users_online', {})
+    guests_online = cache.get('djangobb_guests_online', {})
+    guests_online[guest_sid] = now
+    for user_id in users_online.keys():
+        if users_online[user_id] < delta:
+            del users_online[user_id]
+    for guest_id in guests_online.keys():
+        if guests_online[guest_id] < delta:
+            del guests_online[guest_id]
+    cache.set('djangobb_users_online', users_online, 60 * 60 * 24)
+    cache.set('djangobb_guests_online', guests_online, 60 * 60 * 24)
+
+
+def bench(name, func, guests):
+    for i in xrange(guests):
+        func('guest%d' % i)
+    start = time.time()
+    for i in xrange(REQUESTS):
+        func('guest%d' % (i % guests))
+    elapsed = (time.time() - start) / REQUESTS
+    print '%-10s %8.3f ms per request' % (name, elapsed * 1000)
+
+
+def main(guests):
+    bench('dicts', dict_request, guests)
+    presence = Presence('guests', TIMEOUT, 60)
+    bench('presence', presence.touch, guests)
+    start = time.time()
+    count = presence.count()
+    print '%-10s %8.3f ms to count %d guests' % ('presence', (time.time() - start) * 1000, count)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Compare the single-scan smile replacer with the sequential one
+on text of posts from the database.
+
+Run it from a configured DjangoBB project:
+
+    DJANGO_SETTINGS_MODULE=settings python bench_smiles.py [posts]
+"""
+import sys
+import time
+
+from djangobb_forum.models import Post
+from djangobb_forum import util
+
+ROUNDS = 5
+
+SAMPLE = [
+    u"Thanks, that fixed it :) I was looking at the wrong settings file the whole time.",
+    u"Try `python manage.py syncdb` first =) and check http://docs.djangoproject.com/ for details.",
+    u"No idea :/ maybe ask on the mailing list? It worked for me on 1.3 but not on 1.4 :(",
+    u"LOL :lol: this thread is getting long. Anyway, +1 for the patch ;)",
+    u"A long paragraph without any smiles at all, which is what most of the text looks like "
+    u"in a technical forum: tracebacks, settings, versions and explanations of what was tried.",
+]
+
+
+def bench(name, func, corpus):
+    start = time.time()
+    for i in xrange(ROUNDS):
+        for text in corpus:
+            func(text)
+    elapsed = time.time() - start
+    size = sum(len(text) for text in corpus) * ROUNDS
+    print '%-10s %8.1f ms, %6.1f MB/s' % (name, elapsed * 1000, size / elapsed / 2 ** 20)
+    return elapsed
+
+
+def main(count):
+    corpus = list(Post.objects.order_by('-id').values_list('body', flat=True)[:count])
+    if len(corpus) < count:
+        corpus += SAMPLE * ((count - len(corpus)) // len(SAMPLE) + 1)
+    for text in corpus:
+        assert util._smile_replacer(text) == util._sequential_smile_replacer(text)
+    sequential = bench('sequential', util._sequential_smile_replacer, corpus)
+    single = bench('single', util._smile_replacer, corpus)
+    print 'speedup    %8.1fx' % (sequential / single)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)